@@ -0,0 +1 @@
+__all__ = ["earthquake_parser", "twitter_prefilter"]
@@ -0,0 +1,100 @@
+"""
+Compares the earthquake collector page parsing speed and output using the
+streaming table extractor and using BeautifulSoup, over saved seismology
+pages: a summary page (the seism list) and any number of seism detail pages.
+
+Usage: python -m benchmarks.earthquake_parser <summary.html> [detail.html ...]
+"""
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+from earthquake.extractor import extract_rows
+from earthquake.source import Source, SeismParsingException, parse_seism_page
+
+SUMMARY_ROWS = Source.BUFFER_SIZE + 1
+
+
+def parse_summary_soup(content: bytes) -> List[List[Tuple[str, Optional[str]]]]:
+    soup = BeautifulSoup(content, 'html.parser')
+    rows = []
+    for tr in soup.find_all("tr")[1:SUMMARY_ROWS]:
+        cells = []
+        for td in tr.find_all("td"):
+            link = td.find("a", href=True)
+            cells.append((td.text, link.attrs["href"] if link is not None else None))
+        rows.append(cells)
+    return rows
+
+
+def parse_summary_extractor(content: bytes) -> List[List[Tuple[str, Optional[str]]]]:
+    return [[(td.text, td.href) for td in tds] for tds in extract_rows(content, SUMMARY_ROWS)[1:]]
+
+
+def parse_detail_soup(url: str, content: bytes) -> Dict[str, str]:
+    soup = BeautifulSoup(content, 'html.parser')
+    child_tds = soup.find_all("td")
+    if len(child_tds) != 14:
+        raise SeismParsingException(
+            f"not enough fields in seism page. seism={url}")
+    return {
+        "id": url.split("/")[-1].split(".html")[0],
+        "date": child_tds[3].text,
+        "lat": child_tds[5].text,
+        "long": child_tds[7].text,
+        "depth": child_tds[9].text.split(" ")[0],
+        "magnitude": child_tds[11].text.split(" ")[0],
+    }
+
+
+def parse_pages(summary_fn: Callable, detail_fn: Callable, summary: bytes, details: List[Tuple[str, bytes]]) -> list:
+    # Each summary row is a result of its own, so a mismatch shows the row that differs
+    results = list(summary_fn(summary))
+    for url, content in details:
+        try:
+            results.append(detail_fn(url, content))
+        except SeismParsingException as e:
+            results.append(str(e))
+    return results
+
+
+def run(name: str, summary_fn: Callable, detail_fn: Callable, summary: bytes, details: List[Tuple[str, bytes]],
+        rounds: int = 20) -> list:
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        results = parse_pages(summary_fn, detail_fn, summary, details)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    pages = 1 + len(details)
+    print(f"{name}: {pages / best:,.0f} pages/s ({best * 1000:.2f} ms for {pages} pages)")
+    return results
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    with open(sys.argv[1], "rb") as f:
+        summary = f.read()
+    details = []
+    for path in sys.argv[2:]:
+        with open(path, "rb") as f:
+            details.append((os.path.basename(path), f.read()))
+    soup = run("BeautifulSoup", parse_summary_soup, parse_detail_soup, summary, details)
+    extractor = run("extractor", parse_summary_extractor, parse_seism_page, summary, details)
+    if soup != extractor:
+        print("ERROR: both parsers returned different values")
+        if len(soup) != len(extractor):
+            print(f"  BeautifulSoup returned {len(soup)} values and the extractor {len(extractor)}")
+        for expected, got in zip(soup, extractor):
+            if expected != got:
+                print(f"  BeautifulSoup: {expected}\n  extractor:     {got}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compares the Twitter collector parsing throughput with and without the
+window pre-filter, over recorded sampled stream data (one JSON tweet per line).
+
+Usage: python -m benchmarks.twitter_prefilter <stream.ndjson> [second_start] [tweet_interval]
+"""
+import datetime
+import json
+import sys
+import time
+from typing import Callable, List
+
+from twitter.prefilter import WindowFilter
+from twitter.tweet import Tweet
+
+
+def parse_all(lines: List[bytes], second_start: int, interval: int) -> List[str]:
+    accepted = []
+    for line in lines:
+        t = json.loads(line)["data"]
+        tweet = Tweet(t["id"], t["created_at"], t["author_id"], t["text"])
+        start_date = tweet.date.replace(second=second_start)
+        end_date = start_date + datetime.timedelta(seconds=interval)
+        if start_date <= tweet.date <= end_date:
+            accepted.append(tweet.id)
+    return accepted
+
+
+def parse_filtered(lines: List[bytes], second_start: int, interval: int) -> List[str]:
+    window_filter = WindowFilter(second_start, interval)
+    return parse_all([line for line in lines if window_filter.accepts(line) is not False], second_start, interval)
+
+
+def run(name: str, fn: Callable, lines: List[bytes], second_start: int, interval: int, rounds: int = 5) -> List[str]:
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        accepted = fn(lines, second_start, interval)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name}: {len(lines) / best:,.0f} lines/s ({best * 1000:.1f} ms, {len(accepted)} accepted)")
+    return accepted
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    second_start = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    interval = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    with open(sys.argv[1], "rb") as f:
+        lines = [line.strip() for line in f if len(line.strip()) > 0]
+    full = run("full parse", parse_all, lines, second_start, interval)
+    filtered = run("pre-filter", parse_filtered, lines, second_start, interval)
+    if full != filtered:
+        print("ERROR: both paths accepted different tweets")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
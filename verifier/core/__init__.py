@@ -1 +1 @@
-__all__ = ["abstract_source", "source_manager"]
+__all__ = ["abstract_source", "budget", "http_stream", "record", "source_manager"]
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from core.metrics import Metrics
+
+log = logging.getLogger(__name__)
+
+
+class BudgetExceededException(Exception):
+    def __init__(self, provider: str, wait: Optional[float], cost: float = 1, burst: Optional[float] = None):
+        self.provider = provider
+        # None if the requests can never be sent at once
+        self.wait = wait
+        self.cost = cost
+        self.burst = burst
+
+    def __str__(self):
+        if self.wait is None:
+            return f"BudgetExceededException: {self.cost} {self.provider} requests are more than " \
+                   f"its budget burst of {self.burst}"
+        return f"BudgetExceededException: {self.provider} request budget available in {self.wait:.1f} seconds"
+
+
+class TokenBucket:
+    """
+    Request budget refilled at rate requests per second, up to burst requests.
+    It is shared by the collectors, which run on different threads.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, cost: float, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        Takes cost requests from the budget, even if they are not available yet.
+        :return: the seconds to wait until they are, or None (without taking them) if that is more than max_wait
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (cost - self.tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self.tokens -= cost
+            return wait
+
+    def remaining(self) -> float:
+        return max(0.0, self.tokens)
+
+
+class BudgetManager:
+    """
+    Request budgets of the third-party APIs used by the collectors, with a
+    token bucket for each provider and API token (or key) it is used with.
+    Quotas are read from the "budgets" section of the configuration, as a map
+    from provider name to {"requests": N, "seconds": T, "burst": B}, where
+    burst defaults to N. Providers without a quota are not limited.
+    It also caches the credentials obtained from the providers, so they are
+    not requested again every time a collector restarts.
+    """
+    CREDENTIAL_TTL = 24 * 60 * 60
+
+    def __init__(self, config: Dict[str, map], metrics: Metrics):
+        self.quotas = config
+        self.metrics = metrics
+        self.buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self.credentials: Dict[Tuple[str, str], Tuple[float, str]] = {}
+        self.lock = threading.Lock()
+
+    def get_bucket(self, provider: str, token: str) -> Optional[TokenBucket]:
+        quota = self.quotas.get(provider)
+        if quota is None:
+            return None
+        key = (provider, token)
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                requests = quota["requests"]
+                bucket = self.buckets[key] = TokenBucket(requests / quota["seconds"], quota.get("burst", requests))
+            return bucket
+
+    def max_cost(self, provider: str, token: str = "") -> Optional[int]:
+        """
+        Returns the most requests to provider with token that can be sent at once, or None if there is no limit.
+        """
+        bucket = self.get_bucket(provider, token)
+        if bucket is None:
+            return None
+        return max(1, int(bucket.burst))
+
+    def reserve(self, provider: str, token: str, cost: float, max_wait: Optional[float],
+                count_throttled: bool = True) -> Optional[float]:
+        bucket = self.get_bucket(provider, token)
+        if bucket is None:
+            return 0.0
+        wait = bucket.reserve(cost, max_wait)
+        labels = (provider, fingerprint(token))
+        self.metrics.budget_remaining.labels(*labels).set(bucket.remaining())
+        if count_throttled and (wait is None or wait > 0):
+            self.metrics.budget_throttled.labels(*labels).inc()
+        return wait
+
+    async def acquire(self, provider: str, token: str = "", cost: float = 1, max_wait: Optional[float] = None) -> None:
+        """
+        Waits until cost requests to provider with token can be sent.
+        :raises BudgetExceededException: if that takes longer than max_wait seconds, or if cost is more than the
+        burst of the provider budget
+        """
+        bucket = self.get_bucket(provider, token)
+        if bucket is not None and cost > bucket.burst:
+            raise BudgetExceededException(provider, None, cost, bucket.burst)
+        wait = self.reserve(provider, token, cost, max_wait)
+        if wait is None:
+            raise BudgetExceededException(provider, (cost - bucket.tokens) / bucket.rate)
+        if wait > 0:
+            log.debug(f"waiting {wait:.1f} seconds for {provider} request budget")
+            await asyncio.sleep(wait)
+
+    def try_acquire(self, provider: str, token: str = "", cost: float = 1) -> bool:
+        """
+        Takes cost requests to provider with token from the budget only if they are available now.
+        It is meant for optional requests, like hedged ones, so the requests it does not take are
+        not counted as throttled.
+        """
+        return self.reserve(provider, token, cost, 0, count_throttled=False) is not None
+
+    async def get_credential(self, provider: str, token: str, fetch: Callable[[], Awaitable[str]]) -> str:
+        """
+        Returns the cached credential obtained from provider with token, calling
+        fetch (after drawing from the provider budget) if there is none or it has expired.
+        """
+        key = (provider, token)
+        ttl = self.quotas.get(provider, {}).get("credential_ttl", self.CREDENTIAL_TTL)
+        cached = self.credentials.get(key)
+        if cached is not None and time.monotonic() - cached[0] < ttl:
+            self.metrics.budget_credentials.labels(provider, 'hit').inc()
+            return cached[1]
+        self.metrics.budget_credentials.labels(provider, 'miss').inc()
+        await self.acquire(provider, token)
+        credential = await fetch()
+        self.credentials[key] = (time.monotonic(), credential)
+        return credential
+
+    def invalidate_credential(self, provider: str, token: str) -> None:
+        """
+        Forgets the credential obtained from provider with token, after it was rejected.
+        """
+        self.credentials.pop((provider, token), None)
+
+
+def fingerprint(token: str) -> str:
+    """
+    Returns a short identifier of an API token that can be exported on metrics and logs.
+    """
+    if token == "":
+        return "default"
+    return hashlib.sha256(token.encode()).hexdigest()[:8]
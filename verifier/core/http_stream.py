@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import ssl
+from typing import Dict, Optional
+from urllib.parse import urljoin, urlsplit
+
+log = logging.getLogger(__name__)
+
+
+class HTTPStreamException(Exception):
+    pass
+
+
+class HTTPStream:
+    """
+    Minimal asyncio HTTP/1.1 client for long lived streaming responses.
+    It follows redirects and removes the chunked transfer encoding, so read
+    returns only body bytes.
+    """
+    MAX_REDIRECTS = 5
+    REDIRECT_CODES = {301, 302, 303, 307, 308}
+
+    def __init__(self, url: str, headers: Dict[str, str] = None, timeout: float = 10):
+        self.url = url
+        self.request_headers = headers if headers is not None else {}
+        self.timeout = timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.status = 0
+        self.reason = ""
+        self.headers: Dict[str, str] = {}
+        self.chunked = False
+        # Bytes left in the current chunk (if chunked) or in the body (if Content-Length was sent)
+        self.remaining: Optional[int] = None
+        self.finished = False
+
+    async def open(self) -> None:
+        """
+        Connects to the server and reads the response headers, following redirects.
+        """
+        for _ in range(self.MAX_REDIRECTS + 1):
+            await asyncio.wait_for(self.send_request(), timeout=self.timeout)
+            await asyncio.wait_for(self.read_headers(), timeout=self.timeout)
+            if self.status not in self.REDIRECT_CODES:
+                break
+            location = self.headers.get("location")
+            await self.close()
+            if location is None:
+                raise HTTPStreamException(f"redirect without location from {self.url}")
+            log.info(f"{self.url} redirected to {location}")
+            self.url = urljoin(self.url, location)
+        else:
+            raise HTTPStreamException(f"too many redirects for {self.url}")
+        if self.status // 100 != 2:
+            await self.close()
+            raise HTTPStreamException(f"{self.url} answered with non-200 code: {self.status} {self.reason}")
+        if self.headers.get("transfer-encoding", "").lower() == "chunked":
+            self.chunked = True
+            self.remaining = 0
+        elif "content-length" in self.headers:
+            self.remaining = int(self.headers["content-length"])
+
+    async def send_request(self) -> None:
+        url = urlsplit(self.url)
+        secure = url.scheme == "https"
+        port = url.port if url.port is not None else (443 if secure else 80)
+        self.reader, self.writer = await asyncio.open_connection(
+            url.hostname, port, ssl=ssl.create_default_context() if secure else None)
+        path = url.path if url.path != "" else "/"
+        if url.query != "":
+            path += "?" + url.query
+        headers = {
+            "Host": url.netloc,
+            "Connection": "close",
+        }
+        headers.update(self.request_headers)
+        request = f"GET {path} HTTP/1.1\r\n"
+        request += "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+        self.writer.write((request + "\r\n").encode())
+        await self.writer.drain()
+
+    async def read_headers(self) -> None:
+        # Shoutcast servers answer with "ICY 200 OK" instead of an HTTP status line
+        status_line = (await self.reader.readline()).decode("latin-1").strip()
+        parts = status_line.split(" ", 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise HTTPStreamException(f"invalid status line from {self.url}: {status_line}")
+        self.status = int(parts[1])
+        self.reason = parts[2] if len(parts) > 2 else ""
+        self.headers = {}
+        line = await self.reader.readline()
+        while len(line.strip()) != 0:
+            # empty line means HTTP headers finished
+            k, _, v = line.decode("latin-1").partition(":")
+            self.headers[k.strip().lower()] = v.strip()
+            line = await self.reader.readline()
+        self.chunked = False
+        self.remaining = None
+        self.finished = False
+
+    async def read(self, n: int) -> bytes:
+        """
+        Reads at most n bytes of the response body.
+        :return: the bytes read, or an empty bytes object at the end of the body
+        """
+        if self.finished:
+            return b''
+        if self.chunked and self.remaining == 0:
+            size_line = await self.reader.readline()
+            try:
+                self.remaining = int(size_line.split(b";")[0].strip(), 16)
+            except ValueError:
+                raise HTTPStreamException(f"invalid chunk size from {self.url}: {size_line}")
+            if self.remaining == 0:
+                # Last chunk, followed by optional trailers and an empty line
+                line = await self.reader.readline()
+                while len(line.strip()) != 0:
+                    line = await self.reader.readline()
+                self.finished = True
+                return b''
+        if self.remaining is not None:
+            n = min(n, self.remaining)
+            if n == 0:
+                self.finished = True
+                return b''
+        data = await self.reader.read(n)
+        if len(data) == 0:
+            self.finished = True
+            return data
+        if self.remaining is not None:
+            self.remaining -= len(data)
+            if self.chunked and self.remaining == 0:
+                await self.reader.readexactly(2)  # CRLF after chunk data
+        return data
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception as e:
+                log.debug(f"error closing connection to {self.url}: {e}")
+            self.writer = None
+
+
+class LineReader:
+    """
+    Splits the body of a stream into lines, with a timeout on every read.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, stream: HTTPStream, timeout: float, chunk_size: int = CHUNK_SIZE):
+        self.stream = stream
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.start = 0
+
+    async def readline(self) -> bytes:
+        """
+        Returns the next line of the stream, without its line terminator.
+        :return: the line read, or None at the end of the stream
+        """
+        while True:
+            end = self.buffer.find(b'\n', self.start)
+            if end >= 0:
+                line = bytes(self.buffer[self.start:end]).rstrip(b'\r')
+                self.start = end + 1
+                return line
+            if self.start > 0:
+                del self.buffer[:self.start]
+                self.start = 0
+            data = await asyncio.wait_for(self.stream.read(self.chunk_size), timeout=self.timeout)
+            if len(data) == 0:
+                return None
+            self.buffer += data
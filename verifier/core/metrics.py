@@ -49,6 +49,100 @@ class Metrics():
             'Collector Buffer Size',
             ['source']
         )
+        self.collector_buffer_bytes = Gauge(
+            'collector_buffer_bytes',
+            'Approximate memory used by the collector buffer',
+            ['source']
+        )
+        # Radio Metadata
+        self.radio_resync_events = Counter(
+            'radio_resync_events',
+            'Times the radio stream lost frame sync and recovered it',
+            ['source']
+        )
+        self.radio_skipped_bytes = Counter(
+            'radio_skipped_bytes',
+            'Bytes skipped while looking for a valid radio frame header',
+            ['source']
+        )
+        self.radio_candidates = Counter(
+            'radio_candidates',
+            'Radio frames whose marker could be used as a pulse marker',
+            ['source']
+        )
+        # Earthquake Metadata
+        self.earthquake_requests = Counter(
+            'earthquake_requests',
+            'HTTP requests sent to the earthquake site',
+            ['page']
+        )
+        self.earthquake_cache_hits = Counter(
+            'earthquake_cache_hits',
+            'Earthquake pages that did not need to be downloaded and parsed again',
+            ['page']
+        )
+        self.earthquake_cache_misses = Counter(
+            'earthquake_cache_misses',
+            'Earthquake pages that had to be downloaded and parsed',
+            ['page']
+        )
+        # Ethereum Metadata
+        self.ethereum_request_seconds = Histogram(
+            'ethereum_request_seconds',
+            'Time taken by the requests to each Ethereum provider',
+            ['provider']
+        )
+        self.ethereum_request_errors = Counter(
+            'ethereum_request_errors',
+            'Failed requests to each Ethereum provider',
+            ['provider']
+        )
+        self.ethereum_hedged_requests = Counter(
+            'ethereum_hedged_requests',
+            'Requests sent again to each Ethereum provider because the first one was slower than usual',
+            ['provider']
+        )
+        self.ethereum_provider_demoted = Gauge(
+            'ethereum_provider_demoted',
+            'Whether each Ethereum provider is not being polled because it keeps failing',
+            ['provider']
+        )
+        self.ethereum_block_latency = Histogram(
+            'ethereum_block_latency',
+            'Seconds between the generation of a block and its arrival through a provider subscription',
+            ['provider']
+        )
+        self.ethereum_subscription_active = Gauge(
+            'ethereum_subscription_active',
+            'Whether the new blocks subscription to each Ethereum provider is active (1) or it is being polled (0)',
+            ['provider']
+        )
+        self.ethereum_subscription_reconnects = Counter(
+            'ethereum_subscription_reconnects',
+            'Times the new blocks subscription to each Ethereum provider failed and was started again',
+            ['provider']
+        )
+        self.ethereum_filled_gaps = Counter(
+            'ethereum_filled_gaps',
+            'Blocks missed by the latest block polling and requested by number to each Ethereum provider',
+            ['provider']
+        )
+        # API Budgets
+        self.budget_remaining = Gauge(
+            'budget_remaining',
+            'Requests that can be sent to each provider with each token before being throttled',
+            ['provider', 'token']
+        )
+        self.budget_throttled = Counter(
+            'budget_throttled',
+            'Requests to each provider that were delayed or skipped because its budget was exhausted',
+            ['provider', 'token']
+        )
+        self.budget_credentials = Counter(
+            'budget_credentials',
+            'Credentials taken from the cache (hit) or requested to each provider (miss)',
+            ['provider', 'result']
+        )
         # Exception number
         self.exceptions_number = Summary(
             'exceptions_number',
@@ -60,6 +154,19 @@ class Metrics():
             "Tweets that one side has but the other has not",
             ['owner']
         )
+        self.twitter_queue_size = Gauge(
+            'twitter_queue_size',
+            'Tweets read from the stream waiting to be parsed'
+        )
+        self.twitter_queue_stalls = Counter(
+            'twitter_queue_stalls',
+            'Times the Twitter stream reader waited because the tweet queue was full'
+        )
+        self.twitter_prefilter_lines = Counter(
+            'twitter_prefilter_lines',
+            'Tweet lines accepted or rejected by the window filter before decoding them',
+            ['result']
+        )
 
     def start_server(self, port):
         start_http_server(port)
@@ -0,0 +1,70 @@
+import hashlib
+from abc import ABCMeta, abstractmethod
+from typing import Any, Optional, Tuple
+
+
+class Record(metaclass=ABCMeta):
+    """
+    Base class for the items collected from a source.
+    Subclasses declare their fields in __slots__. The canonical form and the
+    marker of a record are computed the first time they are needed and cached,
+    so the fields they depend on, and those in the tuple and sort key, must not
+    change after the record is created. Other fields can, like the hashes that
+    the Ethereum buffer merges into its blocks.
+    Records are equal if their tuples are equal, and are ordered by their sort key.
+    """
+    __slots__ = ("_canonical", "_marker")
+
+    def __init__(self):
+        self._canonical: Optional[bytes] = None
+        self._marker: Optional[str] = None
+
+    @abstractmethod
+    def get_tuple(self) -> Tuple:
+        """
+        Returns the fields that identify this record.
+        """
+        pass
+
+    @abstractmethod
+    def get_sort_key(self) -> Tuple:
+        """
+        Returns the key used to order records. It must contain the record tuple,
+        so the order is consistent with equality.
+        """
+        pass
+
+    @abstractmethod
+    def canonical_form(self) -> bytes:
+        """
+        Builds the canonical form of the record.
+        """
+        pass
+
+    def get_canonical_form(self) -> bytes:
+        if self._canonical is None:
+            self._canonical = self.canonical_form()
+        return self._canonical
+
+    def get_marker(self) -> Any:
+        if self._marker is None:
+            self._marker = hashlib.sha3_512(self.get_canonical_form()).hexdigest()
+        return self._marker
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.get_tuple() == other.get_tuple()
+
+    def __hash__(self):
+        return hash(self.get_tuple())
+
+    def __lt__(self, other):
+        return self.get_sort_key() < other.get_sort_key()
+
+    def __le__(self, other):
+        return self.get_sort_key() <= other.get_sort_key()
+
+    def __gt__(self, other):
+        return self.get_sort_key() > other.get_sort_key()
+
+    def __ge__(self, other):
+        return self.get_sort_key() >= other.get_sort_key()
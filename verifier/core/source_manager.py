@@ -4,6 +4,7 @@ import logging
 import os
 from datetime import datetime
 from typing import List, Set, Dict
+from core.budget import BudgetManager
 from core.metrics import Metrics
 
 
@@ -35,6 +36,7 @@ class SourceManager:
         os.makedirs(self.output_path, exist_ok=True)
         self.metrics = Metrics()
         self.metrics.start_server(config.get("metrics_port", 9345))
+        self.budgets = BudgetManager(config.get("budgets", {}), self.metrics)
 
     def add_source(self, source) -> None:
         """
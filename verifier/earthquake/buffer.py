@@ -1,18 +1,20 @@
 import logging
 import heapq
 from datetime import datetime
-from collections import OrderedDict
-from typing import List, Set
+from typing import Dict, List
 
 from earthquake.event import Event
-from prometheus_client import Gauge 
+from prometheus_client import Gauge
 
 log = logging.getLogger(__name__)
 
 class Buffer:
+    """
+    Heap of events ordered by date, with an index of the markers of the events in it.
+    """
     def __init__(self, metric: Gauge, size: int):
         self.buffer: List[Event] = []
-        self.set: Set[str] = set()
+        self.markers: Dict[str, Event] = {}
         self.size = size
         self.metric = metric
 
@@ -20,45 +22,35 @@ class Buffer:
         return len(self.buffer)
 
     def add(self, item: Event) -> None:
-        if item.get_marker() not in self.set:
+        marker = item.get_marker()
+        if marker not in self.markers:
             if len(self.buffer) == self.size:
-                item2 = heapq.heappushpop(self.buffer, create_heap_item(item))
-                if item2[-1].get_marker() in self.set:
-                    self.set.remove(item2[-1].get_marker())
-                self.set.add(item.get_marker())
+                removed = heapq.heappushpop(self.buffer, item)
+                if removed is not item:
+                    del self.markers[removed.get_marker()]
+                    self.markers[marker] = item
             else:
-                self.set.add(item.get_marker())
-                heapq.heappush(self.buffer, create_heap_item(item))
+                self.markers[marker] = item
+                heapq.heappush(self.buffer, item)
         self.metric.observe(len(self.buffer))
 
     def check_marker(self, marker: str) -> bool:
         res = False
-        if marker in self.set:
+        if marker in self.markers:
             log.debug(f"checking marker {marker} (buffer size = {len(self.buffer)} items)")
-            while len(self.buffer) > 0:
-                item = heapq.heappop(self.buffer)
-                self.set.remove(item[-1].get_marker())
-                if item[-1].get_marker() == marker:
-                    heapq.heappush(self.buffer, item)
-                    self.set.add(item[-1].get_marker())
-                    res = True
-                    break
+            # Events older than the marked one are not needed anymore
+            while self.buffer[0].get_marker() != marker:
+                del self.markers[heapq.heappop(self.buffer).get_marker()]
+            res = True
         self.metric.observe(len(self.buffer))
         return res
 
     def get_first(self) -> Event:
-        item = heapq.heappop(self.buffer)
-        heapq.heappush(self.buffer, item)
         self.metric.observe(len(self.buffer))
-        return item[-1]
+        return self.buffer[0]
 
     def __str__(self) -> str:
         result = []
         for k in self.buffer:
             result.append(f"{k}")
         return f"EarthquakeBuffer<{','.join(result)}>"
-
-
-
-def create_heap_item(item: Event) -> tuple:
-    return item.date, item.id, item
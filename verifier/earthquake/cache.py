@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from prometheus_client import Counter
+
+log = logging.getLogger(__name__)
+
+
+class PageCache:
+    """
+    Parsed seism detail pages, keyed by their URL and stored with the version
+    of the seism summary row that linked to them, so a page is only reused
+    while its row does not change (for example, when a seism is revised).
+    Entries expire ttl seconds after being stored, and the least recently used
+    entry is evicted when there are more than size of them. If a path is
+    given, the cache is loaded from it at startup and saved to it on every
+    change, so it survives restarts.
+    """
+
+    def __init__(self, hits: Counter, misses: Counter, path: Optional[str] = None,
+                 ttl: float = 86400, size: int = 64):
+        self.entries: OrderedDict[str, tuple] = OrderedDict()
+        self.hits = hits
+        self.misses = misses
+        self.path = path
+        self.ttl = ttl
+        self.size = size
+        self.load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, url: str, version: str = "") -> Optional[Dict[str, str]]:
+        """
+        Returns the data stored for url, or None if it is not on the cache, it has expired or it was
+        stored with a different version.
+        """
+        entry = self.entries.get(url)
+        if entry is not None and (time.time() - entry[0] > self.ttl or entry[1] != version):
+            del self.entries[url]
+            entry = None
+        if entry is None:
+            self.misses.inc()
+            return None
+        self.entries.move_to_end(url)
+        self.hits.inc()
+        return entry[2]
+
+    def put(self, url: str, data: Dict[str, str], version: str = "") -> None:
+        self.entries[url] = (time.time(), version, data)
+        self.entries.move_to_end(url)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        self.save()
+
+    def load(self) -> None:
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"cannot load earthquake page cache from {self.path}: {e}")
+            return
+        now = time.time()
+        for url, entry in entries.items():
+            # Entries saved without a version are discarded
+            if len(entry) == 3 and now - entry[0] <= self.ttl:
+                self.entries[url] = tuple(entry)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        log.info(f"loaded {len(self.entries)} earthquake pages from {self.path}")
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.warning(f"cannot save earthquake page cache to {self.path}: {e}")
+
+
+class ConditionalGet:
+    """
+    Remembers the validators (ETag and Last-Modified) sent with a page, so it
+    is only downloaded again when it changes.
+    """
+
+    def __init__(self):
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+
+    def headers(self) -> Dict[str, str]:
+        """
+        Returns the headers that make the next request conditional.
+        """
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def update(self, headers) -> None:
+        """
+        Stores the validators of a response.
+        """
+        self.etag = headers.get("ETag")
+        self.last_modified = headers.get("Last-Modified")
+
+    def reset(self) -> None:
+        self.etag = None
+        self.last_modified = None
@@ -1,10 +1,13 @@
 import datetime
-import hashlib
 
+from core.record import Record
 
-class Event:
+
+class Event(Record):
+    __slots__ = ("id", "datestr", "date", "lat", "long", "depth", "magnitude")
 
     def __init__(self, id: str, date: str, lat: str, long: str, depth: str, magnitude: str):
+        super().__init__()
         self.id = id
         self.datestr = date
         self.date = datetime.datetime.strptime(date, "%H:%M:%S %d/%m/%Y")
@@ -13,20 +16,14 @@ class Event:
         self.depth = depth
         self.magnitude = magnitude
 
-    def get_canonical_form(self) -> bytes:
+    def canonical_form(self) -> bytes:
         return ";".join(self.get_tuple()).encode()
 
     def get_tuple(self):
         return self.id, self.datestr, self.lat, self.long, self.depth, self.magnitude
 
-    def __eq__(self, other):
-        return self.get_tuple() == other.get_tuple()
-
-    def get_marker(self) -> str:
-        return hashlib.sha3_512(self.get_canonical_form()).hexdigest()
+    def get_sort_key(self):
+        return (self.date,) + self.get_tuple()
 
     def __str__(self) -> str:
         return f"Event<{self.get_canonical_form().decode()}>"
-
-    def __gt__(self, other) -> bool:
-        return self.get_tuple() < other.get_tuple()
\ No newline at end of file
@@ -0,0 +1,144 @@
+import logging
+from html.parser import HTMLParser
+from typing import List, Optional
+
+from bs4.dammit import EncodingDetector
+
+log = logging.getLogger(__name__)
+
+# Elements without an end tag, as handled by BeautifulSoup
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+    'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+    'nextid', 'spacer',
+}
+
+
+class Cell:
+    """
+    A td element: its text and the href of the first link inside it.
+    """
+    __slots__ = ("parts", "href")
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.href: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+class StopExtraction(Exception):
+    pass
+
+
+class TableExtractor(HTMLParser):
+    """
+    Collects the td elements of an HTML page, and the tr elements they belong to,
+    without building a document tree. Unclosed elements nest the same way they
+    do on BeautifulSoup with html.parser, so the rows, cells and texts are the
+    ones BeautifulSoup returns with find_all("tr"), find_all("td") and .text.
+    If max_rows is set, the page is only read until that many rows are complete.
+    """
+
+    def __init__(self, max_rows: Optional[int] = None):
+        super().__init__(convert_charrefs=True)
+        self.max_rows = max_rows
+        self.rows: List[List[Cell]] = []
+        self.cells: List[Cell] = []
+        # Open elements, with the row or cell they represent (or None)
+        self.stack: List[tuple] = []
+        self.open_rows: List[List[Cell]] = []
+        self.open_cells: List[Cell] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            return
+        item = None
+        if tag == "tr":
+            item = []
+            self.rows.append(item)
+            self.open_rows.append(item)
+        elif tag == "td":
+            item = Cell()
+            self.cells.append(item)
+            for row in self.open_rows:
+                row.append(item)
+            self.open_cells.append(item)
+        elif tag == "a" and len(self.open_cells) > 0:
+            href = dict(attrs).get("href")
+            if href is not None:
+                for cell in self.open_cells:
+                    if cell.href is None:
+                        cell.href = href
+        self.stack.append((tag, item))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                break
+        else:
+            # End tag without start tag
+            return
+        while len(self.stack) > i:
+            closed, item = self.stack.pop()
+            if closed == "tr":
+                self.open_rows.pop()
+            elif closed == "td":
+                self.open_cells.pop()
+        if self.max_rows is not None and len(self.open_rows) == 0 and len(self.rows) >= self.max_rows:
+            raise StopExtraction()
+
+    def handle_data(self, data):
+        for cell in self.open_cells:
+            cell.parts.append(data)
+
+    def unknown_decl(self, data):
+        # BeautifulSoup keeps CDATA sections as text
+        if data.upper().startswith("CDATA["):
+            self.handle_data(data[len("CDATA["):])
+
+
+def decode(content: bytes) -> str:
+    """
+    Decodes a page using its declared encoding, or UTF-8 (falling back to Windows-1252) if it has none.
+    """
+    declared = EncodingDetector.find_declared_encoding(content, is_html=True)
+    for encoding in (declared, "utf-8"):
+        if encoding is None:
+            continue
+        try:
+            return content.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            pass
+    return content.decode("windows-1252", errors="replace")
+
+
+def extract(content: bytes, max_rows: Optional[int] = None) -> TableExtractor:
+    extractor = TableExtractor(max_rows)
+    try:
+        extractor.feed(decode(content))
+        extractor.close()
+    except StopExtraction:
+        pass
+    return extractor
+
+
+def extract_rows(content: bytes, max_rows: Optional[int] = None) -> List[List[Cell]]:
+    """
+    Returns the cells of the tr elements of the page, stopping after max_rows rows if it is set.
+    """
+    return extract(content, max_rows).rows[:max_rows]
+
+
+def extract_cells(content: bytes) -> List[Cell]:
+    """
+    Returns all the td elements of the page.
+    """
+    return extract(content).cells
@@ -1,20 +1,20 @@
 from datetime import datetime
 import json
 import logging
-from typing import List
-from bs4 import BeautifulSoup
+from typing import Dict, List
 import asyncio
 from urllib.parse import urljoin
 
 from core.source_manager import SourceManager
 from core.results import VerifierException, VerifierResult
 
-import requests
-from requests.auth import AuthBase
+import httpx
 
 from core.abstract_source import AbstractSource
 from earthquake.buffer import Buffer
+from earthquake.cache import ConditionalGet, PageCache
 from earthquake.event import Event
+from earthquake.extractor import Cell, extract_cells, extract_rows
 
 log = logging.getLogger(__name__)
 
@@ -29,12 +29,23 @@ class SeismParsingException(Exception):
 
 class Source(AbstractSource):
     BUFFER_SIZE = 3
+    CACHE_SIZE = 64
+    CACHE_TTL = 24 * 60 * 60
+    REQUEST_TIMEOUT = 10
     NAME = "earthquake"
 
     def __init__(self, config: map, mgr: SourceManager):
         self.source_url = config["source_url"]
         self.fetch_interval = config["fetch_interval"]
         self.buffer = Buffer(mgr.metrics.collector_buffer_size.labels(self.name()), Source.BUFFER_SIZE)
+        self.summary = ConditionalGet()
+        self.cache = PageCache(mgr.metrics.earthquake_cache_hits.labels("detail"),
+                               mgr.metrics.earthquake_cache_misses.labels("detail"),
+                               config.get("cache_file"),
+                               config.get("cache_ttl", Source.CACHE_TTL),
+                               config.get("cache_size", Source.CACHE_SIZE))
+        self.request_timeout = config.get("request_timeout", Source.REQUEST_TIMEOUT)
+        self.client: httpx.AsyncClient = None
         self.running = False
         super().__init__(mgr)
 
@@ -68,62 +79,109 @@ class Source(AbstractSource):
         return result
 
     async def init_collector(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+        # The summary page and the detail pages of a refresh share the same keep-alive connections
+        self.client = httpx.AsyncClient(
+            timeout=self.request_timeout,
+            pool_limits=httpx.PoolLimits(soft_limit=Source.BUFFER_SIZE + 1, hard_limit=2 * (Source.BUFFER_SIZE + 1)))
         self.running = True
 
     async def collect(self) -> None:
         while self.running:
             start_time = datetime.now()
-            res = requests.get(self.source_url)
-            soup = BeautifulSoup(res.content, 'html.parser')
-            trs = soup.find_all("tr")[1:Source.BUFFER_SIZE + 1]
-            trs
-            if len(trs) != 0:
-                for tr in trs:
-                    try:
-                        seism = self.parse_seism(tr)
-                        self.buffer.add(seism)
-                    except Exception as e:
-                        log.error(f"Error parsing seism: {e}")
-            else:
-                log.error(f"cannot get seism list")
+            await self.fetch_seisms()
             wait_time = max(0, self.fetch_interval -
                             (datetime.now() - start_time).seconds)
             log.debug(f"waiting {wait_time} seconds to fetch again")
             await asyncio.sleep(wait_time)
         log.debug("collector ended")
 
+    async def fetch_seisms(self) -> None:
+        """
+        Adds the latest seisms to the buffer. The summary page is requested
+        conditionally, so nothing is done if it did not change since the last time,
+        and the detail pages of the seisms not cached yet are requested concurrently.
+        """
+        metrics = self.manager.metrics
+        metrics.earthquake_requests.labels("summary").inc()
+        res = await self.client.get(self.source_url, headers=self.summary.headers())
+        if res.status_code == 304:
+            log.debug(f"seism list did not change")
+            metrics.earthquake_cache_hits.labels("summary").inc()
+            return
+        metrics.earthquake_cache_misses.labels("summary").inc()
+        # The first row has the column names
+        trs = extract_rows(res.content, Source.BUFFER_SIZE + 1)[1:]
+        if len(trs) == 0:
+            log.error(f"cannot get seism list")
+            self.summary.reset()
+            return
+        parsed = True
+        seisms = await asyncio.gather(*[self.parse_seism(tr) for tr in trs], return_exceptions=True)
+        for seism in seisms:
+            if isinstance(seism, Exception):
+                parsed = False
+                log.error(f"Error parsing seism: {seism}")
+            else:
+                self.buffer.add(seism)
+        # If a seism failed, the page is downloaded again next time to retry it
+        if parsed:
+            self.summary.update(res.headers)
+        else:
+            self.summary.reset()
+
     async def finish_collector(self) -> None:
         self.running = False
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
 
-    def parse_seism(self, tr):
-        tds = tr.find_all("td")
+    async def parse_seism(self, tds: List[Cell]) -> Event:
         if len(tds) != 8:
             raise SeismParsingException(
                 f"not enough columns in seism summary page.")
-        url = urljoin(self.source_url, tds[0].find(
-            "a", href=True).attrs["href"])
-        # Getting data from that URL:
-        res = requests.get(url)
-        soup = BeautifulSoup(res.content, 'html.parser')
-        child_tds = soup.find_all("td")
-        if len(child_tds) != 14:
+        if tds[0].href is None:
             raise SeismParsingException(
-                f"not enough fields in seism page. seism={url}")
-        id = url.split("/")[-1].split(".html")[0]
-        if id.startswith("erb_"):
-            log.info(f"seism \"{id}\" starts with \"erb_\"")
-        event_data = {
-            "id": id,
-            "date": child_tds[3].text,
-            "lat": child_tds[5].text,
-            "long": child_tds[7].text,
-            "depth": child_tds[9].text.split(" ")[0],
-            "magnitude": child_tds[11].text.split(" ")[0],
-        }
+                f"no link to seism page in seism summary page.")
+        url = urljoin(self.source_url, tds[0].href)
+        # Revised seisms keep their URL, but not their summary row
+        row = "\t".join(td.text for td in tds)
+        event_data = self.cache.get(url, row)
+        if event_data is None:
+            # Getting data from that URL:
+            self.manager.metrics.earthquake_requests.labels("detail").inc()
+            res = await self.client.get(url)
+            event_data = parse_seism_page(url, res.content)
+            event = Event(**event_data)
+            self.cache.put(url, event_data, row)
+            return event
         return Event(**event_data)
-    
+
     def get_possible(self) -> List[str]:
-        return [b[-1].get_marker() for b in self.buffer.buffer] 
+        return list(self.buffer.markers)
+
+
+def parse_seism_page(url: str, content: bytes) -> Dict[str, str]:
+    """
+    Extracts the event data from a seism detail page.
+    """
+    child_tds = extract_cells(content)
+    if len(child_tds) != 14:
+        raise SeismParsingException(
+            f"not enough fields in seism page. seism={url}")
+    id = url.split("/")[-1].split(".html")[0]
+    if id.startswith("erb_"):
+        log.info(f"seism \"{id}\" starts with \"erb_\"")
+    event_data = {
+        "id": id,
+        "date": child_tds[3].text,
+        "lat": child_tds[5].text,
+        "long": child_tds[7].text,
+        "depth": child_tds[9].text.split(" ")[0],
+        "magnitude": child_tds[11].text.split(" ")[0],
+    }
+    return event_data
 
 
 def parse_json_event(str_event: str) -> Event:
@@ -1 +1 @@
-__all__ = ["block", "source"]
+__all__ = ["block", "provider", "quorum", "source", "subscription"]
@@ -1,17 +1,25 @@
-import datetime
-import hashlib
+from core.record import Record
 
 
-class Block:
+class Block(Record):
+    __slots__ = ("number", "hashes")
+
     def __init__(self, number: int, hashes):
+        super().__init__()
         self.number = number
         self.hashes = set()
         self.hashes.update(hashes)
 
-    def __eq__(self, other):
-        return self.number == other.number
+    def canonical_form(self) -> bytes:
+        return str(self.number).encode()
+
+    def get_tuple(self):
+        return self.number,
+
+    def get_sort_key(self):
+        return self.get_tuple()
 
-    def get_marker(self) -> str:
+    def get_marker(self) -> int:
         return self.number
 
     def __str__(self) -> str:
@@ -1,19 +1,27 @@
 import logging
 import heapq
 from collections import OrderedDict
-from typing import List, Set
+from typing import List, Optional, Set, Tuple
 
 from ethereum.block import Block
+from ethereum.quorum import QuorumIndex
 from prometheus_client import Gauge
 
 log = logging.getLogger(__name__)
 
 
 class Buffer:
-    def __init__(self, metric: Gauge, size: int):
+    """
+    Blocks received from a provider, keyed by number and kept in number order,
+    so the oldest block is evicted first. If an index is given, it is kept up
+    to date with the hashes added to and removed from the buffer.
+    """
+    def __init__(self, metric: Gauge, size: int, index: Optional[QuorumIndex] = None, name: str = ""):
         self.buffer = OrderedDict()
         self.size = size
         self.metric = metric
+        self.index = index
+        self.name = name
 
     def __len__(self):
         return len(self.buffer)
@@ -32,13 +40,47 @@ class Buffer:
     
     def add(self, item: Block) -> None:
         if item.get_marker() in self.buffer:
-            self.buffer[item.get_marker()].hashes.update(item.hashes)
+            block = self.buffer[item.get_marker()]
+            new_hashes = item.hashes - block.hashes
+            block.hashes.update(new_hashes)
         else:
-            self.buffer[item.get_marker()] = item   
+            new_hashes = item.hashes
+            self.buffer[item.get_marker()] = item
+            self.move_newer_to_end(item.get_marker())
+        if self.index is not None:
+            self.index.add(self.name, item.number, new_hashes)
         if len(self.buffer) > self.size:
-            self.buffer.popitem(False)
+            self.remove(self.buffer.popitem(False)[1])
         self.metric.observe(len(self.buffer))
 
+    def move_newer_to_end(self, number: int) -> None:
+        """
+        Moves the blocks newer than the one just added after it, as blocks can be received late (like backfilled ones).
+        """
+        newer = []
+        for k in reversed(self.buffer):
+            if k < number:
+                break
+            if k != number:
+                newer.append(k)
+        for k in reversed(newer):
+            self.buffer.move_to_end(k)
+
+    def remove(self, item: Block) -> None:
+        if self.index is not None:
+            self.index.remove(self.name, item)
+
+    def get(self, number: int) -> Optional[Block]:
+        return self.buffer.get(number)
+
+    def get_range(self) -> Optional[Tuple[int, int]]:
+        """
+        Returns the numbers of the first and last blocks on the buffer, or None if it is empty.
+        """
+        if len(self.buffer) == 0:
+            return None
+        return next(iter(self.buffer)), next(reversed(self.buffer))
+
     def check_marker(self, marker: str) -> bool:
         log.debug(f"checking marker {marker} (buffer size = {len(self.buffer)} items)")
         i = 0
@@ -52,6 +94,7 @@ class Buffer:
                     log.debug(f"removed {i} elements before marker...")
                     res = True
                     break
+                self.remove(v)
                 i += 1
         self.metric.observe(len(self.buffer))
         return res
@@ -0,0 +1,345 @@
+import asyncio
+import logging
+import time
+from abc import ABCMeta, abstractmethod
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from core.budget import BudgetExceededException, BudgetManager
+from core.metrics import Metrics
+from ethereum.block import Block
+
+log = logging.getLogger(__name__)
+
+# Providers that only need a token on the "tokens" section of the configuration
+KNOWN_PROVIDERS = {
+    "infura": {
+        "url": "https://mainnet.infura.io/v3/{token}",
+        "ws_url": "wss://mainnet.infura.io/ws/v3/{token}",
+    },
+    "etherscan": {
+        "type": "etherscan",
+        "url": "https://api.etherscan.io/api?module=proxy&action=eth_getBlockByNumber&tag={tag}&boolean=false&apikey={token}",
+    },
+    "rivet": {
+        "url": "https://{token}.eth.rpc.rivet.cloud/",
+        "ws_url": "wss://{token}.eth.ws.rivet.cloud/",
+    },
+}
+
+
+# Keccak-256 hash of an empty uncle list, the sha3Uncles of blocks without uncles
+EMPTY_UNCLES_HASH = "0x1dcc4de8dec75d7aab85b567b6ccd41ad312451b948a7413f0a142fd40d49347"
+
+
+class APIException(Exception):
+    def __init__(self, error):
+        self.err = error
+
+
+def parse_header(header: map) -> (Block, Block):
+    """
+    Returns the block of a newHeads subscription header, and its ancestor with
+    the hash of its parent. Headers do not include the hashes of the uncles,
+    so if has_uncles(header) is True, the whole block is needed for them.
+    """
+    id = int(header["number"], 16)
+    return Block(id, [header["hash"][2:]]), Block(id-1, [header["parentHash"][2:]])
+
+
+def has_uncles(header: map) -> bool:
+    return header.get("sha3Uncles", EMPTY_UNCLES_HASH) != EMPTY_UNCLES_HASH
+
+
+def parse_block(r_json: map) -> (Block, Block):
+    """
+    Returns the block of an eth_getBlockByNumber result, and its ancestor with
+    the hashes of its parent and uncles.
+    """
+    id = int(r_json["number"], 16)
+    ancestor = Block(id-1, [uncle[2:] for uncle in r_json["uncles"]])
+    ancestor.hashes.add(r_json["parentHash"][2:])
+    return Block(id, [r_json["hash"][2:]]), ancestor
+
+
+def get_block_request(tag: str, id=1) -> map:
+    return {
+        "jsonrpc": "2.0",
+        "method": "eth_getBlockByNumber",
+        "params": [tag, False],
+        "id": id,
+    }
+
+
+class LatencyWindow:
+    """
+    Durations of the latest successful requests to a provider.
+    """
+    SIZE = 100
+    MIN_SAMPLES = 20
+
+    def __init__(self, size: int = SIZE):
+        self.samples = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        Returns the p-th percentile of the durations, or None if there are not enough of them yet.
+        """
+        if len(self.samples) < self.MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class Provider(metaclass=ABCMeta):
+    """
+    An Ethereum node API.
+    If a request takes longer than the HEDGE_PERCENTILE-th percentile of the
+    latest ones, an identical request is sent and the first answer is used.
+    Providers that fail MAX_FAILURES requests in a row are demoted, and should
+    not be polled for DEMOTION_TIME seconds.
+    Every request is drawn from the provider budget for its token. Hedged
+    requests are only sent if there is budget left for them.
+    """
+    HEDGE_PERCENTILE = 95
+    MAX_FAILURES = 3
+    DEMOTION_TIME = 60
+
+    def __init__(self, name: str, url: str, metrics: Metrics, budgets: BudgetManager, token: str = "",
+                 ws_url: Optional[str] = None):
+        self.name = name
+        self.url = url
+        self.ws_url = ws_url
+        self.budgets = budgets
+        self.token = token
+        self.latency = LatencyWindow()
+        self.failures = 0
+        self.demoted_until = 0.0
+        self.latency_metric = metrics.ethereum_request_seconds.labels(name)
+        self.errors_metric = metrics.ethereum_request_errors.labels(name)
+        self.hedges_metric = metrics.ethereum_hedged_requests.labels(name)
+        self.demoted_metric = metrics.ethereum_provider_demoted.labels(name)
+
+    @abstractmethod
+    async def fetch_block(self, client: httpx.AsyncClient, tag: str, timeout: float) -> (Block, Block):
+        """
+        Returns the block with the given tag (a hex number or "latest") and its ancestor, as parse_block does.
+        """
+        pass
+
+    @abstractmethod
+    async def fetch_blocks(self, client: httpx.AsyncClient, numbers: List[int], timeout: float) -> List[Block]:
+        """
+        Returns the blocks with the given numbers. Blocks the provider does not have are omitted.
+        """
+        pass
+
+    async def get_latest_block(self, client: httpx.AsyncClient, timeout: float) -> (Block, Block):
+        return await self.call(lambda t: self.fetch_block(client, "latest", t), timeout)
+
+    async def get_block(self, client: httpx.AsyncClient, number: int, timeout: float) -> (Block, Block):
+        return await self.call(lambda t: self.fetch_block(client, hex(number), t), timeout)
+
+    async def get_blocks(self, client: httpx.AsyncClient, numbers: List[int], timeout: float) -> List[Block]:
+        """
+        Returns the blocks with the given numbers, requested in parts no larger than the provider budget burst.
+        Each part waits up to timeout seconds for its budget. If the budget runs out, only the blocks of the
+        parts already requested are returned.
+        :raises BudgetExceededException: if there is no budget left for the first part
+        """
+        size = self.budgets.max_cost(self.name, self.token) or max(1, len(numbers))
+        blocks = []
+        for i in range(0, len(numbers), size):
+            part = numbers[i:i + size]
+            try:
+                # Requests for many blocks are slower than usual, so they are neither hedged nor used to measure latency
+                blocks += await self.call(lambda t: self.fetch_blocks(client, part, t), timeout, hedge=False,
+                                          cost=len(part), max_wait=timeout)
+            except BudgetExceededException as e:
+                if i == 0:
+                    raise
+                log.debug(f"requested {i} of {len(numbers)} blocks from {self.name}: {e}")
+                break
+        return blocks
+
+    def is_demoted(self) -> bool:
+        return time.time() < self.demoted_until
+
+    async def call(self, fn: Callable[[float], Awaitable], timeout: float, hedge: bool = True, cost: int = 1,
+                   max_wait: float = 0):
+        """
+        Awaits fn with the request timeout if the provider budget allows it, waiting up to max_wait seconds for it.
+        :raises BudgetExceededException: if there is no budget left, without counting it as a failure
+        """
+        await self.budgets.acquire(self.name, self.token, cost, max_wait)
+        try:
+            result = await (self.hedged(fn, timeout) if hedge else self.timed(fn, timeout))
+        except Exception:
+            self.errors_metric.inc()
+            self.failures += 1
+            if self.failures >= self.MAX_FAILURES:
+                log.warning(f"ethereum provider {self.name} failed {self.failures} times in a row, "
+                            f"demoting it for {self.DEMOTION_TIME} seconds")
+                self.demoted_until = time.time() + self.DEMOTION_TIME
+                self.demoted_metric.set(1)
+            raise
+        if self.failures >= self.MAX_FAILURES:
+            log.info(f"ethereum provider {self.name} is working again")
+            self.demoted_metric.set(0)
+        self.failures = 0
+        return result
+
+    async def hedged(self, fn: Callable[[float], Awaitable], timeout: float):
+        """
+        Awaits fn with the request timeout, calling it again with the time left if it takes longer than usual,
+        and returns the first successful result, so a hedged request does not take longer than timeout.
+        The time from the first call to the result is recorded as the request latency, even if the result
+        comes from the second call, so hedging does not lower the percentile it is based on.
+        """
+        delay = self.latency.percentile(self.HEDGE_PERCENTILE)
+        start = time.perf_counter()
+        pending = {asyncio.ensure_future(fn(timeout))}
+        try:
+            if delay is not None and delay < timeout:
+                done, pending = await asyncio.wait(pending, timeout=delay)
+                remaining = timeout - (time.perf_counter() - start)
+                if len(done) == 0 and remaining > 0 and self.budgets.try_acquire(self.name, self.token):
+                    log.debug(f"request to {self.name} took more than {delay:.3f} seconds, sending it again")
+                    self.hedges_metric.inc()
+                    pending.add(asyncio.ensure_future(fn(remaining)))
+                pending |= done
+            error = None
+            while len(pending) > 0:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        elapsed = time.perf_counter() - start
+                        self.latency.add(elapsed)
+                        self.latency_metric.observe(elapsed)
+                        return task.result()
+                    error = task.exception() if error is None else error
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def timed(self, fn: Callable[[float], Awaitable], timeout: float):
+        start = time.perf_counter()
+        result = await fn(timeout)
+        self.latency_metric.observe(time.perf_counter() - start)
+        return result
+
+
+class JsonRpcProvider(Provider):
+    """
+    A standard Ethereum JSON-RPC API. If batch is True, blocks are requested
+    in a single batched request.
+    """
+
+    def __init__(self, name: str, url: str, metrics: Metrics, budgets: BudgetManager, token: str = "",
+                 ws_url: Optional[str] = None, batch: bool = True):
+        super().__init__(name, url, metrics, budgets, token, ws_url)
+        self.batch = batch
+
+    async def send(self, client: httpx.AsyncClient, payload, timeout: float):
+        r = await client.post(self.url, json=payload, timeout=timeout)
+        if r.status_code != 200:
+            raise APIException(r.json())
+        return r.json()
+
+    async def fetch_block(self, client: httpx.AsyncClient, tag: str, timeout: float) -> (Block, Block):
+        r_json = await self.send(client, get_block_request(tag), timeout)
+        if r_json.get("result") is None:
+            raise APIException(r_json)
+        return parse_block(r_json["result"])
+
+    async def fetch_blocks(self, client: httpx.AsyncClient, numbers: List[int], timeout: float) -> List[Block]:
+        if self.batch:
+            results = await self.send(client, [get_block_request(hex(number), i) for i, number in enumerate(numbers)],
+                                      timeout)
+            if not isinstance(results, list):
+                raise APIException(results)
+            results.sort(key=lambda item: item.get("id", 0))
+        else:
+            results = [await self.send(client, get_block_request(hex(number)), timeout) for number in numbers]
+        return [parse_block(item["result"])[0] for item in results if item.get("result") is not None]
+
+
+class EtherscanProvider(Provider):
+    """
+    The Etherscan proxy API, which receives the JSON-RPC method and parameters
+    on the URL. It does not support batched requests nor WebSockets.
+    """
+
+    async def get(self, client: httpx.AsyncClient, tag: str, timeout: float) -> map:
+        r = await client.get(self.url.format(tag=tag), timeout=timeout)
+        if r.status_code != 200:
+            raise APIException(r.json())
+        return r.json()
+
+    async def fetch_block(self, client: httpx.AsyncClient, tag: str, timeout: float) -> (Block, Block):
+        r_json = await self.get(client, tag, timeout)
+        if not isinstance(r_json.get("result"), dict):
+            raise APIException(r_json)
+        return parse_block(r_json["result"])
+
+    async def fetch_blocks(self, client: httpx.AsyncClient, numbers: List[int], timeout: float) -> List[Block]:
+        blocks = []
+        for number in numbers:
+            r_json = await self.get(client, hex(number), timeout)
+            if isinstance(r_json.get("result"), dict):
+                blocks.append(parse_block(r_json["result"])[0])
+        return blocks
+
+
+PROVIDER_TYPES = {
+    "jsonrpc": JsonRpcProvider,
+    "etherscan": EtherscanProvider,
+}
+
+
+def create_provider(config: map, metrics: Metrics, budgets: BudgetManager, token: str = "") -> Provider:
+    """
+    Creates a provider from its configuration: its name, its url and
+    optionally its type (jsonrpc or etherscan), its ws_url and, for
+    JSON-RPC providers, whether it supports batched requests.
+    The URLs can include the provider token as {token}.
+    """
+    provider_type = config.get("type", "jsonrpc")
+    if provider_type not in PROVIDER_TYPES:
+        raise ValueError(f"unknown ethereum provider type: {provider_type}")
+    # Other placeholders, like the block tag on Etherscan URLs, are kept
+    url = config["url"].replace("{token}", token)
+    ws_url = config.get("ws_url")
+    if ws_url is not None:
+        ws_url = ws_url.replace("{token}", token)
+    if provider_type == "jsonrpc":
+        return JsonRpcProvider(config["name"], url, metrics, budgets, token, ws_url, config.get("batch", True))
+    return PROVIDER_TYPES[provider_type](config["name"], url, metrics, budgets, token, ws_url)
+
+
+def create_providers(config: map, metrics: Metrics, budgets: BudgetManager) -> Dict[str, Provider]:
+    """
+    Creates the known providers with a token on the "tokens" section of the
+    configuration, and the providers defined on its "providers" section.
+    """
+    providers = {}
+    for name, token in config.get("tokens", {}).items():
+        if token is None:
+            continue
+        if name not in KNOWN_PROVIDERS:
+            log.warning(f"unknown ethereum provider {name}, add it to the providers section instead")
+            continue
+        providers[name] = create_provider(dict(KNOWN_PROVIDERS[name], name=name), metrics, budgets, token)
+    for provider_config in config.get("providers", []):
+        providers[provider_config["name"]] = create_provider(provider_config, metrics, budgets,
+                                                             provider_config.get("token", ""))
+    return providers
@@ -0,0 +1,64 @@
+import logging
+from typing import Dict, List, Set, Tuple
+
+from ethereum.block import Block
+
+log = logging.getLogger(__name__)
+
+
+class QuorumIndex:
+    """
+    Index of the block hashes held by the provider buffers, mapping each block
+    number to its hashes and each hash to the providers that have it.
+    Buffers update it when blocks are added or removed, so the providers that
+    agree on a block hash and the hashes on which at least threshold providers
+    agree are known without going through the buffers.
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.blocks: Dict[int, Dict[str, Set[str]]] = {}
+        # (block number, hash) pairs with at least threshold providers
+        self.quorum: Set[Tuple[int, str]] = set()
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def add(self, provider: str, number: int, hashes: Set[str]) -> None:
+        block = self.blocks.setdefault(number, {})
+        for h in hashes:
+            providers = block.setdefault(h, set())
+            providers.add(provider)
+            if len(providers) >= self.threshold:
+                self.quorum.add((number, h))
+
+    def remove(self, provider: str, item: Block) -> None:
+        block = self.blocks.get(item.number)
+        if block is None:
+            return
+        for h in item.hashes:
+            providers = block.get(h)
+            if providers is None:
+                continue
+            providers.discard(provider)
+            if len(providers) < self.threshold:
+                self.quorum.discard((item.number, h))
+            if len(providers) == 0:
+                del block[h]
+        if len(block) == 0:
+            del self.blocks[item.number]
+
+    def get_providers(self, number: int, h: str) -> Set[str]:
+        """
+        Returns the providers that have a block with the given number and hash.
+        """
+        return self.blocks.get(number, {}).get(h, set())
+
+    def has_quorum(self, number: int, h: str) -> bool:
+        return (number, h) in self.quorum
+
+    def possible_count(self) -> int:
+        return len(self.quorum)
+
+    def get_possible(self) -> List[str]:
+        return [f"{number}:{h}" for number, h in list(self.quorum)]
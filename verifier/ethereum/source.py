@@ -1,128 +1,63 @@
 from datetime import datetime
+import functools
 import json
 import logging
-from typing import List
-from bs4 import BeautifulSoup
+import time
+from typing import Dict, List
 import asyncio
-from urllib.parse import urljoin
 
-import requests
-from requests.auth import AuthBase
+import httpx
 
 from core.source_manager import SourceManager
-from core.results import VerifierException, VerifierResult
+from core.results import VerifierResult
 
 from core.abstract_source import AbstractSource
+from core.budget import BudgetExceededException
 from ethereum.buffer import Buffer
 
 from ethereum.block import Block
-
-from typing import Set
+from ethereum.provider import Provider, create_providers, has_uncles, parse_header
+from ethereum.quorum import QuorumIndex
+from ethereum.subscription import Subscription
 
 log = logging.getLogger(__name__)
 
 
-class APIException(Exception):
-    def __init__(self, error):
-        self.err = error
-
-
 class NotEnoughAPIsException(Exception):
     pass
 
 
-class Infura():
-    NAME = "infura"
-
-    def __init__(self, token):
-        self.url = "https://mainnet.infura.io/v3/"
-        self.token = token
-
-    def get_latest_block(self, timeout=0) -> (Block, Block):
-        r = requests.post(self.url + self.token, json={
-            "jsonrpc": "2.0",
-            "method": "eth_getBlockByNumber",
-            "params": ["latest", False],
-            "id": "1",
-        }, timeout=timeout)
-        if r.status_code != 200:
-            raise APIException(r.json())
-        r_json = r.json()["result"]
-        id = int(r_json["number"], 16)
-        ancestor = Block(id-1, [uncle[2:] for uncle in r_json["uncles"]])
-        ancestor.hashes.add(r_json["parentHash"][2:])
-        return Block(id, [r_json["hash"][2:]]), ancestor
-
-
-class EtherScan():
-    NAME = "etherscan"
-
-    def __init__(self, token):
-        self.url = "https://api.etherscan.io/api?module=proxy&action=eth_getBlockByNumber&tag=latest&boolean=false&apikey={}"
-        self.token = token
-
-    def get_latest_block(self, timeout=0) -> (Block, Block):
-        r = requests.get(self.url.format(self.token), timeout=timeout)
-        if r.status_code != 200:
-            raise APIException(r.json())
-        r_json = r.json()["result"]
-        id = int(r_json["number"], 16)
-        ancestor = Block(id-1, [uncle[2:] for uncle in r_json["uncles"]])
-        ancestor.hashes.add(r_json["parentHash"][2:])
-        return Block(id, [r_json["hash"][2:]]), ancestor
-
-
-class Rivet():
-    NAME = "rivet"
-
-    def __init__(self, token):
-        self.url = "https://{}.eth.rpc.rivet.cloud/"
-        self.token = token
-
-    def get_latest_block(self, timeout=0) -> (Block, Block):
-        r = requests.post(self.url.format(self.token), json={
-            "jsonrpc": "2.0",
-            "method": "eth_getBlockByNumber",
-            "params": ["latest", False],
-            "id": "1",
-        }, timeout=timeout)
-        if r.status_code != 200:
-            raise APIException(r.json())
-        r_json = r.json()["result"]
-        id = int(r_json["number"], 16)
-        ancestor = Block(id-1, [uncle[2:] for uncle in r_json["uncles"]])
-        ancestor.hashes.add(r_json["parentHash"][2:])
-        return Block(id, [r_json["hash"][2:]]), ancestor
-
-
 class Source(AbstractSource):
     BUFFER_SIZE = 120
+    MAX_BACKFILL = 32
     NAME = "ethereum"
-    REGISTERED_APIS = [
-        Infura,
-        EtherScan,
-        Rivet
-    ]
 
     def __init__(self, config: map, mgr: SourceManager):
-        self.sources = {}
         self.buffers = {}
         self.running = False
-        self.fetch_interval = 6
+        self.fetch_interval = config.get("fetch_interval", 6)
+        self.request_timeout = config.get("request_timeout", self.fetch_interval - 1)
+        self.client: httpx.AsyncClient = None
+        # Number of the latest block received from each provider
+        self.last_blocks = {}
+        # If true, new blocks are received through WebSocket subscriptions from the providers that support them
+        self.subscribe = config.get("subscribe", False)
+        self.subscriptions: Dict[str, Subscription] = {}
+        self.subscription_tasks: List[asyncio.Task] = []
         self.threshold = max(config.get("threshold", 1), 1)
         self.block_id_module = config.get("block_id_module", 1)
-        for api in Source.REGISTERED_APIS:
-            token = config.get("tokens", {}).get(f"{api.NAME}", None)
-            if token is not None:
-                self.sources[api.NAME] = api(token)
-                self.buffers[api.NAME] = Buffer(mgr.metrics.collector_buffer_size.labels(f"{self.name()}_{api.NAME}"), Source.BUFFER_SIZE)
+        self.index = QuorumIndex(self.threshold)
+        self.sources: Dict[str, Provider] = create_providers(config, mgr.metrics, mgr.budgets)
+        for name in self.sources:
+            self.buffers[name] = Buffer(mgr.metrics.collector_buffer_size.labels(f"{self.name()}_{name}"),
+                                        Source.BUFFER_SIZE, self.index, name)
         if len(self.sources) < self.threshold:
             raise NotEnoughAPIsException()
         super().__init__(mgr)
 
     async def verify(self, params: map) -> map:
         result = VerifierResult(self.name())
-        result.possible = len(self.get_possible())
+        result.possible = self.index.possible_count()
         status = params.get("status", 2)
         result.ext_value_status = status
         if (status & 2) == 2 :
@@ -133,25 +68,16 @@ class Source(AbstractSource):
         else:
             block_num = int(params["metadata"], 16)
             if block_num % self.block_id_module == 0:
-                errors = []
-                correct = 0
-                for k, buffer in self.buffers.items():
-                    if buffer.check_marker(block_num):
-                        block = buffer.get_first()
-                        if params["raw"] in block.hashes:
-                            correct += 1
-                        else:
-                            error = f"Block hash not found in generation. block_number={block_num} block_hash={params['raw']} source_name={k} source_buffer_length={len(buffer)} source_buffer={buffer}"
+                providers = self.index.get_providers(block_num, params["raw"])
+                correct = len(providers)
+                if correct < self.threshold:
+                    errors = []
+                    for k, buffer in self.buffers.items():
+                        if k not in providers:
+                            error = self.describe_error(k, buffer, block_num, params["raw"])
                             errors.append(error)
                             log.debug(error)
-                    else:
-                        error = f"Block number not found on buffer. block_number={block_num} source_name={k} source_buffer_length={len(buffer)} source_buffer={buffer}"
-                        errors.append(error)
-                        log.debug(error)
-                if correct >= self.threshold:
-                    result.code = 204
-                else:
-                    result.code = 222
+                    result.status_code = 222
                     result.add_detail(
                         f"Not enough valid nodes to verify",
                         f"total_nodes={len(self.buffers)}",
@@ -159,7 +85,7 @@ class Source(AbstractSource):
                         f"correct={correct}",
                         f"errors={json.dumps(errors)}")
             else:
-                result.code = 220
+                result.status_code = 220
                 result.add_detail(
                     f"Incorrect block number module", 
                     f"module={self.block_id_module}",
@@ -167,53 +93,144 @@ class Source(AbstractSource):
         result.finish()
         return result
 
+    def describe_error(self, name: str, buffer: Buffer, block_num: int, block_hash: str) -> str:
+        """
+        Explains why a provider does not have a block hash, without listing its whole buffer.
+        """
+        block = buffer.get(block_num)
+        if block is not None:
+            return f"Block hash not found in generation. block_number={block_num} block_hash={block_hash} source_name={name} source_hashes={sorted(block.hashes)}"
+        return f"Block number not found on buffer. block_number={block_num} source_name={name} source_buffer_length={len(buffer)} source_buffer_range={buffer.get_range()}"
+
     async def init_collector(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+        # Every provider keeps its own keep-alive connection between rounds
+        self.client = httpx.AsyncClient(
+            timeout=self.request_timeout,
+            pool_limits=httpx.PoolLimits(soft_limit=len(self.sources), hard_limit=2 * len(self.sources)))
+        await self.cancel_subscriptions()
+        if self.subscribe:
+            metrics = self.manager.metrics
+            for api in self.sources.values():
+                if api.ws_url is None:
+                    continue
+                subscription = Subscription(api.name, api.ws_url, functools.partial(self.add_header, api),
+                                            metrics.ethereum_subscription_active.labels(api.name),
+                                            metrics.ethereum_subscription_reconnects.labels(api.name))
+                self.subscriptions[api.name] = subscription
+                self.subscription_tasks.append(asyncio.create_task(subscription.run()))
         self.running = True
 
     async def collect(self) -> None:
-        timeout = self.fetch_interval//len(self.sources)
         while self.running:
             start_time = datetime.now()
-            for api in self.sources.values():
-                log.debug(
-                    f"Fetching latest ethereum block from {api.NAME} (timeout: {timeout})")
-                try:
-                    block, ancestor = api.get_latest_block(timeout)
-                    if block.number % self.block_id_module == 0: 
-                        self.buffers[api.NAME].add(block)
-                    elif block.number % self.block_id_module == 1:
-                        self.buffers[api.NAME].add(ancestor)
-                except Exception as e:
-                    log.error(f"error getting block from {api.NAME}: {e}")
+            await asyncio.gather(*[self.fetch_latest_block(api) for api in self.sources.values()
+                                   if not self.is_subscribed(api) and not api.is_demoted()])
             wait_time = max(0, self.fetch_interval -
                             (datetime.now() - start_time).seconds)
             log.debug(f"waiting {wait_time} seconds to fetch again")
             await asyncio.sleep(wait_time)
         log.debug("collector ended")
 
+    async def fetch_latest_block(self, api) -> None:
+        """
+        Adds the latest block of a provider (or its ancestor) to the provider
+        buffer, after the blocks missed since the last time it was asked.
+        """
+        log.debug(
+            f"Fetching latest ethereum block from {api.name} (timeout: {self.request_timeout})")
+        try:
+            block, ancestor = await api.get_latest_block(self.client, self.request_timeout)
+            await self.add_latest_block(api, block, ancestor)
+        except BudgetExceededException as e:
+            log.warning(f"not polling {api.name}: {e}")
+        except Exception as e:
+            log.error(f"error getting block from {api.name}: {e}")
+
+    async def add_header(self, api, header: map) -> None:
+        """
+        Adds the block of a header received from a provider subscription.
+        """
+        self.manager.metrics.ethereum_block_latency.labels(api.name).observe(
+            max(0, time.time() - int(header["timestamp"], 16)))
+        block, ancestor = parse_header(header)
+        if block.number % self.block_id_module == 1 and has_uncles(header):
+            # The ancestor is added, and pulses can use the hashes of its uncles, which are only on the whole block
+            try:
+                full_block, full_ancestor = await api.get_block(self.client, block.number, self.request_timeout)
+                if full_block.hashes == block.hashes:
+                    ancestor = full_ancestor
+                else:
+                    log.debug(f"block {block.number} from {api.name} changed after its header was received")
+            except Exception as e:
+                log.warning(f"error getting the uncles of block {block.number} from {api.name}, "
+                            f"adding its ancestor without them: {e}")
+        await self.add_latest_block(api, block, ancestor)
+
+    async def add_latest_block(self, api, block: Block, ancestor: Block) -> None:
+        """
+        Adds the latest block of a provider (or its ancestor) to the provider
+        buffer, after the blocks missed since the previous one.
+        """
+        try:
+            await self.backfill(api, block.number)
+        except Exception as e:
+            # The gap is requested again with the next block
+            log.error(f"error backfilling blocks from {api.name}: {e}")
+        if block.number % self.block_id_module == 0:
+            self.buffers[api.name].add(block)
+        elif block.number % self.block_id_module == 1:
+            self.buffers[api.name].add(ancestor)
+
+    async def backfill(self, api, latest: int) -> None:
+        """
+        Adds to the provider buffer the blocks usable on pulses that were
+        generated after the last block received from the provider and before latest.
+        If the request fails, or some blocks are not received, the gap is
+        requested again with the next block.
+        """
+        last = self.last_blocks.get(api.name)
+        buffer = self.buffers[api.name]
+        if last is not None:
+            # Gaps are requested again until they are filled, but only for the latest MAX_BACKFILL usable blocks
+            last = max(last, latest - 1 - Source.MAX_BACKFILL * self.block_id_module)
+            self.last_blocks[api.name] = last
+            # The ancestor of latest is added from the latest block response
+            end = latest - 1 if latest % self.block_id_module == 1 else latest
+            missing = [number for number in range(last + 1, end)
+                       if number % self.block_id_module == 0 and number not in buffer.buffer]
+            if len(missing) > 0:
+                log.debug(f"backfilling {len(missing)} ethereum blocks from {api.name}: {missing}")
+                blocks = await api.get_blocks(self.client, missing, self.request_timeout)
+                for block in blocks:
+                    buffer.add(block)
+                self.manager.metrics.ethereum_filled_gaps.labels(api.name).inc(len(blocks))
+                received = {block.number for block in blocks}
+                unfilled = [number for number in missing if number not in received]
+                if len(unfilled) > 0:
+                    # Blocks not received, like those left out when the budget runs out, are requested again
+                    self.last_blocks[api.name] = max(last, unfilled[0] - 1)
+                    return
+        self.last_blocks[api.name] = latest if last is None else max(last, latest)
+
+    def is_subscribed(self, api) -> bool:
+        subscription = self.subscriptions.get(api.name)
+        return subscription is not None and subscription.active
+
+    async def cancel_subscriptions(self) -> None:
+        for task in self.subscription_tasks:
+            task.cancel()
+        await asyncio.gather(*self.subscription_tasks, return_exceptions=True)
+        self.subscription_tasks = []
+        self.subscriptions = {}
+
     async def finish_collector(self) -> None:
         self.running = False
+        await self.cancel_subscriptions()
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
 
-    def get_all(self) -> Set[str]:
-        possible = set()
-        for buffer in self.buffers.values():
-            for block_id, block in buffer.items():
-                for h in block.hashes.values():
-                    val = f"{block_id}:{h}"
-                    if val not in possible:
-                        possible.add(val)
-        return possible
-    
-    
     def get_possible(self) -> List[str]:
-        possible = {}
-        for buffer in self.buffers.values():
-            for block_id, block in buffer.buffer.items():
-                for h in block.hashes:
-                    val = f"{block_id}:{h}"
-                    if val not in possible:
-                        possible[val] = 0
-                    possible[val] += 1
-        return [v for v in possible.values() if v >= self.threshold]
-
-
+        return self.index.get_possible()
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+import websockets
+from prometheus_client import Counter, Gauge
+
+log = logging.getLogger(__name__)
+
+
+class SubscriptionException(Exception):
+    pass
+
+
+class Subscription:
+    """
+    Receives the headers of new blocks from a provider through a WebSocket
+    JSON-RPC eth_subscribe("newHeads") subscription, reconnecting to it after errors.
+    While the subscription is not active, the provider must be polled instead.
+    """
+    RESTART_TIME = 5
+    # Ethereum blocks are generated every few seconds, so a longer silence means the connection is broken
+    TIMEOUT = 60
+
+    def __init__(self, name: str, url: str, on_header: Callable[[map], Awaitable],
+                 health_metric: Gauge, reconnects_metric: Counter):
+        self.name = name
+        self.url = url
+        self.on_header = on_header
+        self.health_metric = health_metric
+        self.reconnects_metric = reconnects_metric
+        self.ws: Optional[websockets.WebSocketClientProtocol] = None
+        self.active = False
+        self.last_header = 0.0
+
+    async def connect(self) -> None:
+        log.info(f"Subscribing to new ethereum blocks from {self.name}...")
+        self.ws = await websockets.connect(self.url, open_timeout=self.TIMEOUT)
+        await self.ws.send(json.dumps({
+            "jsonrpc": "2.0",
+            "method": "eth_subscribe",
+            "params": ["newHeads"],
+            "id": 1,
+        }))
+        while True:
+            msg = json.loads(await asyncio.wait_for(self.ws.recv(), timeout=self.TIMEOUT))
+            if msg.get("id") == 1:
+                break
+        if msg.get("result") is None:
+            raise SubscriptionException(f"{self.name} rejected the subscription: {msg.get('error')}")
+        log.debug(f"subscribed to new ethereum blocks from {self.name} (id {msg['result']})")
+        self.set_active(True)
+
+    async def receive(self) -> None:
+        msg = json.loads(await asyncio.wait_for(self.ws.recv(), timeout=self.TIMEOUT))
+        if msg.get("method") == "eth_subscription":
+            self.last_header = time.time()
+            await self.on_header(msg["params"]["result"])
+
+    async def close(self) -> None:
+        self.set_active(False)
+        if self.ws is not None:
+            try:
+                await self.ws.close()
+            except Exception as e:
+                log.debug(f"error closing subscription to {self.name}: {e}")
+            self.ws = None
+
+    def set_active(self, active: bool) -> None:
+        self.active = active
+        self.health_metric.set(1 if active else 0)
+
+    async def run(self) -> None:
+        """
+        Receives block headers until cancelled, subscribing again after errors.
+        """
+        while True:
+            try:
+                await self.connect()
+                while True:
+                    await self.receive()
+            except asyncio.CancelledError:
+                await self.close()
+                raise
+            except Exception as e:
+                self.reconnects_metric.inc()
+                log.error(
+                    f"Exception in ethereum subscription to {self.name}: {e.__str__()}, "
+                    f"polling it and subscribing again in {self.RESTART_TIME} seconds...")
+                await self.close()
+                await asyncio.sleep(self.RESTART_TIME)
@@ -1 +1 @@
-__all__ = ["frame", "source"]
+__all__ = ["frame", "demuxer", "compare", "icy", "station", "source"]
@@ -1,66 +1,398 @@
+import asyncio
+import heapq
 import logging
-from collections import OrderedDict
-from typing import List, Set
+import sys
+import threading
+from array import array
+from collections import deque
+from typing import Callable, Deque, Dict, Hashable, List, Optional, Tuple
 
-from radio.frame import Frame
-from prometheus_client import Gauge
+from radio.frame import Frame, FrameHeader
+from prometheus_client import Counter, Gauge, Summary
 
 
 log = logging.getLogger(__name__)
 
 
+class SequenceWaiters:
+    """
+    Futures waiting for a buffer to reach a sequence number.
+    Buffers are filled by the collector thread while futures belong to the
+    verifier event loop, so futures are resolved through their own loop.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters: List[Tuple[int, int, asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    async def wait(self, target: int, current: Callable[[], int]) -> None:
+        """
+        Waits until current() is at least target.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.lock:
+            heapq.heappush(self.waiters, (target, id(future), loop, future))
+        # Checked after registering the future, so a concurrent notify cannot be missed
+        if current() >= target:
+            set_done(future)
+        await future
+
+    def notify(self, current: int) -> None:
+        """
+        Resolves the futures waiting for a sequence number up to current.
+        """
+        if len(self.waiters) == 0 or self.waiters[0][0] > current:
+            return
+        with self.lock:
+            while len(self.waiters) > 0 and self.waiters[0][0] <= current:
+                _, _, loop, future = heapq.heappop(self.waiters)
+                loop.call_soon_threadsafe(set_done, future)
+
+
+def set_done(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class CandidateIndex:
+    """
+    Frames whose marker is a possible pulse marker (lower or equal than the
+    prefix followed by "f"s), in arrival order.
+    Repeated frames have a single marker, so the number of candidates is the
+    number of distinct digests in the index.
+    """
+
+    def __init__(self, prefix: str, metric: Counter):
+        prefix = prefix.lower()
+        # Comparing the first bytes of the digest with this limit is the same as
+        # comparing the hex marker with the prefix followed by "f"s
+        self.limit = bytes.fromhex(prefix + "f" * (len(prefix) % 2))
+        self.positions: Deque[Tuple[int, bytes]] = deque()
+        self.counts: Dict[bytes, int] = {}
+        self.metric = metric
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, seq: int, digest: bytes) -> None:
+        if digest[:len(self.limit)] <= self.limit:
+            self.positions.append((seq, digest))
+            self.counts[digest] = self.counts.get(digest, 0) + 1
+            self.metric.inc()
+
+    def evict(self, first: int) -> None:
+        """
+        Removes the candidates older than the given sequence number.
+        """
+        while len(self.positions) > 0 and self.positions[0][0] < first:
+            _, digest = self.positions.popleft()
+            self.counts[digest] -= 1
+            if self.counts[digest] == 0:
+                del self.counts[digest]
+
+    def markers(self) -> List[str]:
+        return [digest.hex() for digest in self.counts]
+
+
+class MarkerIndex:
+    """
+    Sequence numbers of the frames in a buffer by their marker.
+    A repeated marker is indexed by its first occurrence still in the buffer,
+    as the marker-keyed buffer did. Later occurrences are only kept for the
+    markers seen more than once, so the index moves to them when the first
+    one is evicted.
+    """
+
+    def __init__(self):
+        self.first: Dict[Hashable, int] = {}
+        self.repeats: Dict[Hashable, Deque[int]] = {}
+
+    def __len__(self):
+        return len(self.first)
+
+    def add(self, marker: Hashable, seq: int) -> None:
+        if marker in self.first:
+            self.repeats.setdefault(marker, deque()).append(seq)
+        else:
+            self.first[marker] = seq
+
+    def remove(self, marker: Hashable, seq: int) -> None:
+        """
+        Removes the occurrence of the marker with the given sequence number, which must be its oldest one.
+        """
+        if self.first.get(marker) != seq:
+            return
+        repeats = self.repeats.get(marker)
+        if repeats is None:
+            del self.first[marker]
+            return
+        self.first[marker] = repeats.popleft()
+        if len(repeats) == 0:
+            del self.repeats[marker]
+
+    def get(self, marker: Hashable) -> Optional[int]:
+        return self.first.get(marker)
+
+
 class Buffer:
-    def __init__(self, metric: Gauge, size: int, prefix: str):
-        self.buffer = OrderedDict()
+    """
+    Frame buffer indexed by sequence number.
+    Each frame added gets the next sequence number, and frames are kept in a
+    ring where their slot is the sequence number modulo the buffer size.
+    Lookups do not remove frames, which are only evicted when the buffer is full.
+    """
+
+    def __init__(self, metric: Gauge, candidates_metric: Counter, size: int, prefix: str):
+        self.frames: List[Optional[Frame]] = [None] * size
+        self.index = MarkerIndex()
         self.prefix = prefix
         self.size = size
-        self.possible: Set(str) = set()
+        self.candidates = CandidateIndex(prefix, candidates_metric)
         self.metric = metric
+        # Sequence numbers of the oldest frame and of the next frame to add
+        self.first = 0
+        self.next = 0
+        self.waiters = SequenceWaiters()
 
     def __len__(self):
-        return len(self.buffer)
+        return self.next - self.first
+
+    def pop(self) -> None:
+        slot = self.first % self.size
+        marker = self.frames[slot].get_marker()
+        self.frames[slot] = None
+        self.index.remove(marker, self.first)
+        self.first += 1
+        self.candidates.evict(self.first)
 
     def add(self, item: Frame) -> None:
-        self.buffer[item.get_marker()] = item
-        limit = self.prefix + "f" * (len(item.get_marker()) - len(self.prefix))
-        if item.get_marker() <= limit:
-            self.possible.add(item.get_marker())
-        if len(self.buffer) > self.size:
-            k, popped = self.buffer.popitem(False)
-            if k in self.possible:
-                self.possible.remove(k)
-        self.metric.observe(len(self.buffer))
+        if len(self) == self.size:
+            self.pop()
+        marker = item.get_marker()
+        self.frames[self.next % self.size] = item
+        self.index.add(marker, self.next)
+        self.candidates.add(self.next, item.get_digest())
+        self.next += 1
+        self.waiters.notify(self.next)
+        self.metric.observe(len(self))
+
+    def find(self, marker: str) -> Optional[int]:
+        """
+        Returns the sequence number of the frame with the given marker, or None if it is not in the buffer.
+        """
+        log.debug(
+            f"checking marker {marker} (buffer size = {len(self)} items)")
+        return self.index.get(marker)
 
     def check_marker(self, marker: str) -> bool:
+        return self.find(marker) is not None
+
+    def frames_after(self, seq: int) -> int:
+        """
+        Returns the number of frames in the buffer starting at the given sequence number.
+        """
+        return max(0, self.next - max(seq, self.first))
+
+    async def wait_frames(self, seq: int, n: int) -> None:
+        """
+        Waits until the n frames starting at the given sequence number have been added.
+        It can be awaited from a different thread than the one adding frames.
+        """
+        await self.waiters.wait(seq + n, lambda: self.next)
+
+    def get_list(self, seq: int, size: int) -> List[Frame]:
+        """
+        Returns size frames starting at the given sequence number, or an empty list if they are not all in the buffer.
+        """
+        if seq < self.first or seq + size > self.next:
+            log.debug(
+                f"frames {seq}-{seq + size} not in buffer ({self.first}-{self.next})")
+            return []
+        start, end = seq % self.size, (seq + size) % self.size
+        if start < end or size == 0:
+            return self.frames[start:end]
+        return self.frames[start:] + self.frames[:end]
+
+    def get_possible(self) -> List[str]:
+        return self.candidates.markers()
+
+    def possible_count(self) -> int:
+        return len(self.candidates)
+
+
+class CompactBuffer:
+    """
+    Frame buffer that keeps the frame bytes in a single ring, their offsets
+    and lengths in fixed width arrays and their raw SHA3 digests in a
+    contiguous byte array.
+    As in Buffer, frames are identified by a sequence number, and their slot
+    in the arrays is the sequence number modulo the buffer size.
+    The ring starts with INITIAL_BYTES and doubles while it cannot hold size
+    frames, up to size * frame_size bytes, so its memory follows the
+    bitrate of the stream.
+    """
+    DIGEST_SIZE = 64
+    INITIAL_BYTES = 64 * 1024
+
+    def __init__(self, metric: Summary, bytes_metric: Gauge, candidates_metric: Counter,
+                 size: int, prefix: str, frame_size: int):
+        self.prefix = prefix
+        self.size = size
+        self.metric = metric
+        self.bytes_metric = bytes_metric
+        self.max_bytes = size * frame_size
+        self.data = bytearray(min(self.INITIAL_BYTES, self.max_bytes))
+        self.view = memoryview(self.data)
+        self.offsets = array("L", [0]) * size
+        self.lengths = array("H", [0]) * size
+        self.digests = bytearray(size * self.DIGEST_SIZE)
+        self.index = MarkerIndex()
+        self.candidates = CandidateIndex(prefix, candidates_metric)
+        # Sequence numbers of the oldest frame and of the next frame to add
+        self.first = 0
+        self.next = 0
+        self.write_pos = 0
+        self.waiters = SequenceWaiters()
+
+    def __len__(self):
+        return self.next - self.first
+
+    def get_digest(self, seq: int) -> bytes:
+        slot = (seq % self.size) * self.DIGEST_SIZE
+        return bytes(self.digests[slot:slot + self.DIGEST_SIZE])
+
+    def get_frame(self, seq: int) -> Frame:
+        slot = seq % self.size
+        offset = self.offsets[slot]
+        data = bytes(self.view[offset:offset + self.lengths[slot]])
+        header = FrameHeader()
+        header.parse(data)
+        return Frame(header, data, self.get_digest(seq))
+
+    def pop(self) -> None:
+        digest = self.get_digest(self.first)
+        self.index.remove(digest, self.first)
+        self.first += 1
+        self.candidates.evict(self.first)
+
+    def overwrites(self, length: int) -> bool:
+        """
+        Returns True if adding a frame of length bytes would overwrite the oldest frame.
+        """
+        if len(self) == 0:
+            return length > len(self.data)
+        start = self.write_pos
+        wrap = start + length > len(self.data)
+        end = (0 if wrap else start) + length
+        offset = self.offsets[self.first % self.size]
+        return (offset >= start or offset < end) if wrap else (start <= offset < end)
+
+    def grow(self, length: int) -> None:
+        """
+        Moves the frames to a ring at least twice as large (up to max_bytes) with room for length more bytes.
+        """
+        data = bytearray(min(self.max_bytes, max(2 * len(self.data), len(self.data) + length)))
+        pos = 0
+        for seq in range(self.first, self.next):
+            slot = seq % self.size
+            offset, size = self.offsets[slot], self.lengths[slot]
+            data[pos:pos + size] = self.view[offset:offset + size]
+            self.offsets[slot] = pos
+            pos += size
+        self.view.release()
+        self.data = data
+        self.view = memoryview(data)
+        self.write_pos = pos
+        log.debug(f"radio buffer grown to {len(data)} bytes")
+
+    def add(self, item: Frame) -> None:
+        data = item.get_canonical_form()
+        length = len(data)
+        if len(self) < self.size and len(self.data) < self.max_bytes and self.overwrites(length):
+            self.grow(length)
+        if length > len(self.data):
+            log.error(f"frame of {length} bytes does not fit in buffer")
+            return
+        start = self.write_pos
+        wrap = start + length > len(self.data)
+        if wrap:
+            self.write_pos = 0
+        end = self.write_pos + length
+        # Frames overwritten by the new one are always the oldest ones
+        while len(self) > 0:
+            offset = self.offsets[self.first % self.size]
+            overwritten = (offset >= start or offset < end) if wrap else (start <= offset < end)
+            if len(self) < self.size and not overwritten:
+                break
+            self.pop()
+        digest = item.get_digest()
+        slot = self.next % self.size
+        self.data[self.write_pos:end] = data
+        self.offsets[slot] = self.write_pos
+        self.lengths[slot] = length
+        self.digests[slot * self.DIGEST_SIZE:(slot + 1) * self.DIGEST_SIZE] = digest
+        self.index.add(digest, self.next)
+        self.candidates.add(self.next, digest)
+        self.write_pos = end
+        self.next += 1
+        self.waiters.notify(self.next)
+        self.metric.observe(len(self))
+        self.bytes_metric.set(self.memory_footprint())
+
+    def find(self, marker: str) -> Optional[int]:
+        """
+        Returns the sequence number of the frame with the given marker, or None if it is not in the buffer.
+        """
         log.debug(
-            f"checking marker {marker} (buffer size = {len(self.buffer)} items)")
-        i = 0
-        resp = False
-        if marker in self.buffer:
-            while len(self.buffer) > 0:
-                k, v = self.buffer.popitem(False)
-                if k == marker:
-                    self.buffer[k] = v
-                    self.buffer.move_to_end(k, False)
-                    log.debug(f"removed {i} elements before hash...")
-                    resp = True
-                    break
-                if k in self.possible:
-                    self.possible.remove(k)
-                i += 1
-        self.metric.observe(len(self.buffer))
-        return resp
-
-    def get_list(self, size: int) -> List[Frame]:
-        res: List[Frame] = []
-        if len(self.buffer) < size:
+            f"checking marker {marker} (buffer size = {len(self)} items)")
+        try:
+            return self.index.get(bytes.fromhex(marker))
+        except ValueError:
+            return None
+
+    def check_marker(self, marker: str) -> bool:
+        return self.find(marker) is not None
+
+    def frames_after(self, seq: int) -> int:
+        """
+        Returns the number of frames in the buffer starting at the given sequence number.
+        """
+        return max(0, self.next - max(seq, self.first))
+
+    async def wait_frames(self, seq: int, n: int) -> None:
+        """
+        Waits until the n frames starting at the given sequence number have been added.
+        It can be awaited from a different thread than the one adding frames.
+        """
+        await self.waiters.wait(seq + n, lambda: self.next)
+
+    def get_list(self, seq: int, size: int) -> List[Frame]:
+        """
+        Returns size frames starting at the given sequence number, or an empty list if they are not all in the buffer.
+        """
+        if seq < self.first or seq + size > self.next:
             log.debug(
-                f"buffer not full yet ({len(self.buffer)}/{self.size}), try again in a few seconds...")
-        else:
-            for _ in range(size):
-                k, v = self.buffer.popitem(False)
-                if k in self.possible:
-                    self.possible.remove(k)
-                res.append(v)
-        self.metric.observe(len(self.buffer))
-        return res
+                f"frames {seq}-{seq + size} not in buffer ({self.first}-{self.next})")
+            return []
+        return [self.get_frame(i) for i in range(seq, seq + size)]
+
+    def get_possible(self) -> List[str]:
+        return self.candidates.markers()
+
+    def possible_count(self) -> int:
+        return len(self.candidates)
+
+    def memory_footprint(self) -> int:
+        """
+        Returns the approximate number of bytes used by this buffer.
+        """
+        key_size = sys.getsizeof(bytes(self.DIGEST_SIZE))
+        return (sys.getsizeof(self.data) +
+                sys.getsizeof(self.offsets) +
+                sys.getsizeof(self.lengths) +
+                sys.getsizeof(self.digests) +
+                sys.getsizeof(self.index.first) +
+                sys.getsizeof(self.candidates.positions) +
+                sys.getsizeof(self.candidates.counts) +
+                len(self.index) * key_size)
@@ -0,0 +1,53 @@
+import hashlib
+from typing import List, Optional
+
+from radio.frame import Frame
+
+
+class Mismatch:
+    """
+    Describes the first point where our frames and the beacon raw value diverge.
+    """
+
+    def __init__(self, frame_index: int, offset: int, ours: bytes, theirs: bytes):
+        self.frame_index = frame_index
+        self.offset = offset
+        self.ours = ours
+        self.theirs = theirs
+
+    def get_details(self) -> List[str]:
+        return [
+            f"frame_index={self.frame_index}",
+            f"byte_offset={self.offset}",
+            f"our_frame_length={len(self.ours)}",
+            f"their_frame_length={len(self.theirs)}",
+            f"our_frame_hash={hashlib.sha3_512(self.ours).hexdigest()}",
+            f"their_frame_hash={hashlib.sha3_512(self.theirs).hexdigest()}",
+        ]
+
+
+def compare_frames(frames: List[Frame], raw: str) -> Optional[Mismatch]:
+    """
+    Compares a list of frames with the hex encoded raw value of a pulse,
+    frame by frame and without joining them.
+    :param frames: frames extracted from the buffer
+    :param raw: hex encoded concatenation of the frames used by the beacon
+    :return: None if both are equal, or the first mismatch found
+    """
+    try:
+        theirs = memoryview(bytes.fromhex(raw))
+    except ValueError:
+        return Mismatch(0, 0, frames[0].get_canonical_form() if len(frames) > 0 else b'', b'')
+    offset = 0
+    for i, frame in enumerate(frames):
+        ours = frame.get_canonical_form()
+        their_frame = theirs[offset:offset + len(ours)]
+        if their_frame != ours:
+            j = 0
+            while j < len(their_frame) and their_frame[j] == ours[j]:
+                j += 1
+            return Mismatch(i, offset + j, ours, bytes(their_frame))
+        offset += len(ours)
+    if offset != len(theirs):
+        return Mismatch(len(frames), offset, b'', bytes(theirs[offset:]))
+    return None
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from typing import Dict, List, Union
+
+from prometheus_client import Counter
+
+from core.http_stream import HTTPStream
+from radio.frame import Frame, FrameHeader, InvalidFrameHeaderException
+from radio.icy import IcyReader
+
+log = logging.getLogger(__name__)
+
+
+class EndOfStreamException(Exception):
+    pass
+
+
+class SyncLostException(Exception):
+    pass
+
+
+class Demuxer:
+    """
+    Splits an MP3 stream into frames.
+
+    The stream is read in large chunks into a reusable buffer, and frame
+    headers and bodies are sliced out of it using memoryviews, so each frame
+    costs a single copy (its own bytes) instead of several small reads.
+
+    When an invalid frame header is found, the demuxer skips bytes until it
+    finds two consecutive valid frame headers, and only gives up if it cannot
+    find them in MAX_RESYNC_BYTES bytes.
+    """
+    CHUNK_SIZE = 64 * 1024
+    MAX_CACHED_HEADERS = 256
+    MAX_RESYNC_BYTES = 64 * 1024
+
+    def __init__(self, reader: Union[asyncio.StreamReader, HTTPStream, IcyReader],
+                 resync_metric: Counter, skipped_metric: Counter,
+                 chunk_size: int = CHUNK_SIZE):
+        self.reader = reader
+        self.resync_metric = resync_metric
+        self.skipped_metric = skipped_metric
+        self.chunk_size = chunk_size
+        # The buffer holds at least a full chunk after moving the pending bytes to its start.
+        self.buffer = bytearray(2 * chunk_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        # Frame headers of a stream rarely change, so they are parsed once and reused.
+        self.headers: Dict[int, FrameHeader] = {}
+        self.syncing = False
+        self.skipped = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    async def fill(self) -> None:
+        """
+        Reads the next chunk of the stream into the buffer.
+        """
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif len(self.buffer) - self.end < self.chunk_size:
+            pending = self.end - self.start
+            self.buffer[:pending] = bytes(self.view[self.start:self.end])
+            self.start, self.end = 0, pending
+        data = await self.reader.read(self.chunk_size)
+        if len(data) == 0:
+            raise EndOfStreamException("radio stream closed by server")
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def get_header(self, pos: int) -> FrameHeader:
+        """
+        Returns the parsed header of the frame starting at pos in the buffer.
+        """
+        key = int.from_bytes(self.view[pos:pos + FrameHeader.SIZE], "big")
+        header = self.headers.get(key)
+        if header is None:
+            header = FrameHeader()
+            header.parse(self.view[pos:pos + FrameHeader.SIZE])
+            if len(self.headers) >= self.MAX_CACHED_HEADERS:
+                self.headers.clear()
+            self.headers[key] = header
+        return header
+
+    def skip(self, n: int) -> None:
+        """
+        Discards n bytes of the buffer while looking for a valid frame header.
+        """
+        self.start += n
+        self.skipped += n
+        self.skipped_metric.inc(n)
+        if self.skipped > self.MAX_RESYNC_BYTES:
+            raise SyncLostException(f"cannot find a valid frame header after skipping {self.skipped} bytes")
+
+    def resync(self) -> bool:
+        """
+        Skips bytes until the buffer starts with two consecutive valid frame headers.
+        :return: True if the stream is in sync again, False if more data is needed
+        """
+        while self.end - self.start >= FrameHeader.SIZE:
+            pos = self.buffer.find(b'\xff', self.start, self.end)
+            self.skip((pos if pos >= 0 else self.end) - self.start)
+            if self.end - self.start < FrameHeader.SIZE:
+                break
+            try:
+                size = self.get_header(self.start).frame_size()
+                if self.end - self.start < size + FrameHeader.SIZE:
+                    break
+                self.get_header(self.start + size)
+            except InvalidFrameHeaderException:
+                self.skip(1)
+                continue
+            log.info(f"radio stream in sync again after skipping {self.skipped} bytes")
+            self.resync_metric.inc()
+            self.syncing = False
+            self.skipped = 0
+            return True
+        return False
+
+    def parse_frames(self) -> List[Frame]:
+        """
+        Extracts all the complete frames present on the buffer.
+        """
+        frames: List[Frame] = []
+        while self.end - self.start >= FrameHeader.SIZE:
+            if self.syncing and not self.resync():
+                break
+            try:
+                header = self.get_header(self.start)
+            except InvalidFrameHeaderException as e:
+                log.warning(f"radio stream out of sync ({e}), looking for next frame...")
+                self.syncing = True
+                self.skip(1)
+                continue
+            size = header.frame_size()
+            if self.end - self.start < size:
+                break
+            frame = Frame(header, bytes(self.view[self.start:self.start + size]))
+            frame.get_digest()
+            frames.append(frame)
+            self.start += size
+        return frames
+
+    async def read_frames(self) -> List[Frame]:
+        """
+        Returns the next frames of the stream, reading from it only if there
+        are no complete frames already buffered.
+        :return: a non-empty list of frames
+        """
+        frames = self.parse_frames()
+        while len(frames) == 0:
+            await self.fill()
+            frames = self.parse_frames()
+        return frames
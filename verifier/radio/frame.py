@@ -3,23 +3,29 @@ import hashlib
 from enum import Enum
 
 
-class InvalidSyncByteException(Exception):
+class InvalidFrameHeaderException(Exception):
     pass
 
 
-class NonLayer3Exception(Exception):
+class InvalidSyncByteException(InvalidFrameHeaderException):
     pass
 
 
-class InvalidBitrateException(Exception):
+class NonLayer3Exception(InvalidFrameHeaderException):
     pass
 
 
-class InvalidSampleRateException(Exception):
+class InvalidBitrateException(InvalidFrameHeaderException):
+    pass
+
+
+class InvalidSampleRateException(InvalidFrameHeaderException):
     pass
 
 
 class FrameHeader:
+    SIZE = 4
+
     class Version(Enum):
         MPEG_1 = 1
         MPEG_2 = 0
@@ -83,13 +89,18 @@ class FrameHeader:
 
     async def read(self, sock: asyncio.StreamReader):
         # Read frame header
-        b = (await sock.read(1))[0]
-        self.data += bytes([b])
+        self.parse(await sock.readexactly(self.SIZE))
+
+    def parse(self, data: bytes):
+        """
+        Parses a frame header from its first SIZE bytes.
+        :param data: bytes-like object with at least SIZE bytes
+        """
+        b = data[0]
         if b != 0xff:
             raise InvalidSyncByteException(f"Invalid sync byte in this frame (should have been \\xff but it is {b})")
         # Next byte should be 0xf<x>
-        b = (await sock.read(1))[0]
-        self.data += bytes([b])
+        b = data[1]
         if (b & 0xf0) != 0xf0:
             raise InvalidSyncByteException(f"Invalid sync byte in this frame (should have been \\xf0 but it is {b})")
         self.version = FrameHeader.Version((b & 0x08) >> 3)
@@ -97,8 +108,7 @@ class FrameHeader:
             # Layer is not 3 (0x01)
             raise NonLayer3Exception(f"MPEG frame is not layer 3 type")
         self.crc = True if (b & 0x01) == 0x01 else False
-        b = (await sock.read(1))[0]
-        self.data += bytes([b])
+        b = data[2]
         bitrate = b >> 4
         if bitrate == 0x00 or bitrate == 0x0f:
             # invalid values
@@ -111,31 +121,47 @@ class FrameHeader:
         padding = (b & 0x02) >> 1
         if padding == 1:
             self.padding = True
-        b = (await sock.read(1))[0]
-        self.data += bytes([b])
-        self.body_size = 144000 * self.bitrate // self.samplerate - 4  # substract the header length
+        self.data = bytes(data[:self.SIZE])
+        self.body_size = 144000 * self.bitrate // self.samplerate - self.SIZE  # substract the header length
         if self.padding:
             self.body_size += 1  # MP3 padding size is 1 byte
 
+    def frame_size(self) -> int:
+        """
+        Returns the size of the whole frame described by this header, header included.
+        """
+        return self.SIZE + self.body_size
+
 
 class Frame:
-    def __init__(self):
-        self.header = FrameHeader()
-        self.data = b''
+    def __init__(self, header: FrameHeader = None, data: bytes = b'', digest: bytes = None):
+        self.header = header if header is not None else FrameHeader()
+        # data contains the whole frame, header included
+        self.data = data
+        self.digest = digest
+        self.marker = None
 
     def get_canonical_form(self) -> bytes:
-        return self.header.data + self.data
+        return self.data
+
+    def get_digest(self) -> bytes:
+        """
+        Returns the SHA3-512 digest of the frame, computing it only the first time.
+        """
+        if self.digest is None:
+            self.digest = hashlib.sha3_512(self.data).digest()
+        return self.digest
 
     def get_marker(self) -> str:
-        return hashlib.sha3_512(self.get_canonical_form()).hexdigest()
+        if self.marker is None:
+            self.marker = self.get_digest().hex()
+        return self.marker
 
     async def read(self, reader: asyncio.StreamReader):
         await self.header.read(reader)
-        to_read = self.header.body_size
-        while to_read != 0:
-            new_data = await reader.read(to_read)
-            to_read -= len(new_data)
-            self.data += new_data
+        self.data = self.header.data + await reader.readexactly(self.header.body_size)
+        self.get_digest()
 
     def __str__(self) -> str:
         return f"Frame<hash={self.get_marker()}>"
+
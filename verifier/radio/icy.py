@@ -0,0 +1,68 @@
+import logging
+
+from core.http_stream import HTTPStream
+
+log = logging.getLogger(__name__)
+
+
+class IcyReader:
+    """
+    Removes the metadata blocks that Icecast and Shoutcast servers interleave
+    in the audio stream every icy-metaint bytes.
+    Audio data is returned as memoryviews of the chunks read from the stream,
+    so stripping the metadata does not copy it.
+    """
+
+    def __init__(self, stream: HTTPStream, metaint: int):
+        self.stream = stream
+        self.metaint = metaint
+        self.pending = memoryview(b'')
+        # Audio bytes left before the next metadata block
+        self.audio_left = metaint
+        # Metadata bytes left to skip, or None if the next byte is the metadata length
+        self.metadata_left = 0
+        self.metadata = bytearray()
+        self.title = ""
+
+    async def read(self, n: int) -> memoryview:
+        """
+        Reads at most n audio bytes from the stream.
+        :return: the audio bytes read, or an empty memoryview at the end of the stream
+        """
+        while True:
+            if len(self.pending) == 0:
+                chunk = await self.stream.read(n)
+                if len(chunk) == 0:
+                    return memoryview(chunk)
+                self.pending = memoryview(chunk)
+            if self.audio_left > 0:
+                size = min(n, self.audio_left, len(self.pending))
+                data = self.pending[:size]
+                self.pending = self.pending[size:]
+                self.audio_left -= size
+                if self.audio_left == 0:
+                    self.metadata_left = None
+                return data
+            if self.metadata_left is None:
+                # Metadata length is sent in 16 byte blocks
+                self.metadata_left = self.pending[0] * 16
+                self.pending = self.pending[1:]
+                self.metadata.clear()
+            size = min(self.metadata_left, len(self.pending))
+            self.metadata += self.pending[:size]
+            self.pending = self.pending[size:]
+            self.metadata_left -= size
+            if self.metadata_left == 0:
+                self.audio_left = self.metaint
+                if len(self.metadata) > 0:
+                    self.parse_metadata()
+
+    def parse_metadata(self) -> None:
+        text = self.metadata.rstrip(b'\x00').decode("utf-8", errors="replace")
+        for field in text.split(";"):
+            k, _, v = field.partition("=")
+            if k == "StreamTitle":
+                title = v.strip("'")
+                if title != self.title:
+                    self.title = title
+                    log.debug(f"radio stream title changed to \"{title}\"")
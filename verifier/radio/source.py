@@ -6,10 +6,11 @@ from core.results import VerifierException, VerifierResult
 
 
 from core.abstract_source import AbstractSource
-from radio.buffer import Buffer
-from radio.frame import Frame
+from radio.buffer import Buffer, CompactBuffer
+from radio.compare import compare_frames, Mismatch
+from radio.station import Station
 
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 log = logging.getLogger(__name__)
 
@@ -17,18 +18,39 @@ log = logging.getLogger(__name__)
 class Source(AbstractSource):
     BUFFER_SIZE = 26 * 1000 * 2 * 5
     FRAMES_NUM = 300
+    # Frame size of a 320 kbps, 44.1 kHz stream
+    FRAME_SIZE = 1045
+    CHECK_INTERVAL = 5
     NAME = "radio"
 
     def __init__(self, config: map, mgr: SourceManager):
-        self.url = config["url"]
-        self.port = config["port"]
         self.prefix = config["prefix"]
-        self.buffer = Buffer(mgr.metrics.collector_buffer_size.labels(self.name()), self.BUFFER_SIZE, config["prefix"])
+        # Endpoints are consulted in this order when verifying
+        endpoints = [config] + config.get("alt_endpoints", [])
+        self.stations: List[Station] = []
+        for i, endpoint in enumerate(endpoints):
+            name = endpoint.get("name", f"{endpoint['url']}:{endpoint['port']}")
+            url = f"http://{endpoint['url']}:{endpoint['port']}{endpoint.get('path', '/;')}"
+            # The main endpoint keeps the source name as its metric label
+            label = self.name() if i == 0 else f"{self.name()}_{name}"
+            self.stations.append(Station(name, url, self.new_buffer(config, mgr, label), mgr.metrics, label))
+        self.buffer = self.stations[0].buffer
+        self.tasks: List[asyncio.Task] = []
         super().__init__(mgr)
 
+    def new_buffer(self, config: map, mgr: SourceManager, label: str):
+        if config.get("compact_buffer", False):
+            return CompactBuffer(mgr.metrics.collector_buffer_size.labels(label),
+                                 mgr.metrics.collector_buffer_bytes.labels(label),
+                                 mgr.metrics.radio_candidates.labels(label),
+                                 self.BUFFER_SIZE, self.prefix, config.get("frame_size", self.FRAME_SIZE))
+        return Buffer(mgr.metrics.collector_buffer_size.labels(label),
+                      mgr.metrics.radio_candidates.labels(label),
+                      self.BUFFER_SIZE, self.prefix)
+
     async def verify(self, params: map) -> map:
         result = VerifierResult(self.name())
-        result.possible = len(self.get_possible())
+        result.possible = self.possible_count()
         status = params.get("status", 2)
         result.ext_value_status = status
         if (status & 2) == 2 :
@@ -46,49 +68,98 @@ class Source(AbstractSource):
                     f"limit={limit}",
                     f"metadata={params['metadata']}")
             else:
-                if self.buffer.check_marker(params["metadata"]):
-                    while len(self.buffer) < self.FRAMES_NUM:
-                        log.debug(
-                            f"we need {self.FRAMES_NUM} frames to generate randomness but we have {len(self.buffer)}, waiting 5 seconds...")
-                        await asyncio.sleep(5)
-                    frames = self.buffer.get_list(self.FRAMES_NUM)
-                    d = b''
-                    log.debug(f"joining raw data from {len(frames)} frames...")
-                    for frame in frames:
-                        d += frame.get_canonical_form()
-                    log.debug(f"Data joined, comparing with event data:")
-                    d_hex = d.hex()
-                    if d_hex != params["raw"]:
-                        result.status_code = 221
-                        result.add_detail(
-                            f"Raw value does not match",
-                            f"ours={d_hex}",
-                            f"theirs={params['raw']}")
-                else:
+                found, mismatch = await self.find_match(params["metadata"], params["raw"])
+                if found is None:
                     result.status_code = 222
                     result.add_detail(
                         f"Metadata not found",
                         f"metadata={params['metadata']}",
                         f"buffer_size={len(self.buffer)}")
+                elif mismatch is not None:
+                    result.status_code = 221
+                    result.add_detail(
+                        f"Raw value does not match",
+                        f"endpoint={found.name}",
+                        *mismatch.get_details())
+                else:
+                    result.add_detail(f"endpoint={found.name}")
         result.finish()
         return result
 
+    async def find_match(self, marker: str, raw: str) -> Tuple[Optional[Station], Optional[Mismatch]]:
+        """
+        Compares the raw value with the frames of each endpoint having the marker.
+        Endpoints that already have all the frames are compared first, in priority
+        order, and the others as soon as their frames arrive, so an endpoint that
+        stopped streaming after the marker does not hold back the rest.
+        :return: the matching endpoint, or the first endpoint (in priority order) having the marker and its mismatch.
+        None if no endpoint has the marker.
+        """
+        mismatches = {}
+        waiting = {}
+        try:
+            for station in self.stations:
+                seq = station.buffer.find(marker)
+                if seq is None:
+                    continue
+                if station.buffer.frames_after(seq) < self.FRAMES_NUM:
+                    log.debug(
+                        f"we need {self.FRAMES_NUM} frames to generate randomness but {station.name} has {station.buffer.frames_after(seq)}, waiting for them...")
+                    task = asyncio.ensure_future(station.buffer.wait_frames(seq, self.FRAMES_NUM))
+                    waiting[task] = (station, seq)
+                    continue
+                if self.compare(station, seq, raw, mismatches):
+                    return station, None
+            pending = set(waiting)
+            while len(pending) > 0:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    station, seq = waiting[task]
+                    if self.compare(station, seq, raw, mismatches):
+                        return station, None
+        finally:
+            for task in waiting:
+                task.cancel()
+        for station in self.stations:
+            if station in mismatches:
+                return station, mismatches[station]
+        return None, None
+
+    def compare(self, station: Station, seq: int, raw: str, mismatches: Dict[Station, Mismatch]) -> bool:
+        """
+        Compares the raw value with the frames of the endpoint starting at seq, and stores the mismatch if any.
+        :return: True if they match. An endpoint whose marker frame was evicted
+        while waiting for the rest is left out, as if it never had the marker.
+        """
+        frames = station.buffer.get_list(seq, self.FRAMES_NUM)
+        if len(frames) == 0:
+            log.debug(f"frame {seq} was evicted from {station.name} buffer")
+            return False
+        log.debug(f"comparing {len(frames)} frames from {station.name} with event data...")
+        mismatches[station] = compare_frames(frames, raw)
+        return mismatches[station] is None
+
     async def init_collector(self) -> None:
-        self.reader, self.writer = await asyncio.open_connection(self.url, self.port)
-        self.writer.write(b'GET /; HTTP/1.0\r\n\r\n')
-        line = await self.reader.readline()
-        while len(line.strip()) != 0:
-            # empty line means HTTP headers finished
-            line = await self.reader.readline()
+        self.tasks = [asyncio.create_task(station.run()) for station in self.stations]
 
     async def collect(self):
-        frame = Frame()
-        await asyncio.wait_for(frame.read(self.reader), timeout=5)
-        self.buffer.add(frame)
+        # Each endpoint is collected and restarted by its own task
+        await asyncio.sleep(self.CHECK_INTERVAL)
 
     async def finish_collector(self) -> None:
-        self.writer.close()
-        await self.writer.wait_closed()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
 
     def get_possible(self) -> List[str]:
-        return [p for p in self.buffer.possible]
\ No newline at end of file
+        possible = set()
+        for station in self.stations:
+            possible.update(station.buffer.get_possible())
+        return list(possible)
+
+    def possible_count(self) -> int:
+        """
+        Returns the number of possible markers of the endpoint with most of them.
+        Endpoints stream the same audio, so their possible markers mostly overlap.
+        """
+        return max(station.buffer.possible_count() for station in self.stations)
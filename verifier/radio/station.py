@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import Optional, Union
+
+from core.http_stream import HTTPStream
+from core.metrics import Metrics
+from radio.buffer import Buffer, CompactBuffer
+from radio.demuxer import Demuxer
+from radio.icy import IcyReader
+
+log = logging.getLogger(__name__)
+
+
+class Station:
+    """
+    Collects the frames of a single radio stream endpoint into its own buffer,
+    reconnecting to it independently of the other endpoints.
+    """
+    RESTART_TIME = 5
+    READ_TIMEOUT = 5
+
+    def __init__(self, name: str, url: str, buffer: Union[Buffer, CompactBuffer], metrics: Metrics,
+                 metric_label: str):
+        self.name = name
+        self.url = url
+        self.buffer = buffer
+        self.metrics = metrics
+        self.metric_label = metric_label
+        self.stream: Optional[HTTPStream] = None
+        self.demuxer: Optional[Demuxer] = None
+
+    async def connect(self) -> None:
+        log.info(f"Connecting to radio endpoint {self.name} ({self.url})...")
+        self.stream = HTTPStream(self.url, {"User-Agent": "RandomVerifier-Python"})
+        await self.stream.open()
+        reader = self.stream
+        metaint = int(self.stream.headers.get("icy-metaint", 0))
+        if metaint > 0:
+            log.debug(f"radio endpoint {self.name} sends metadata every {metaint} bytes")
+            reader = IcyReader(self.stream, metaint)
+        self.demuxer = Demuxer(reader,
+                               self.metrics.radio_resync_events.labels(self.metric_label),
+                               self.metrics.radio_skipped_bytes.labels(self.metric_label))
+
+    async def collect(self) -> None:
+        frames = await asyncio.wait_for(self.demuxer.read_frames(), timeout=self.READ_TIMEOUT)
+        for frame in frames:
+            self.buffer.add(frame)
+
+    async def close(self) -> None:
+        if self.stream is not None:
+            await self.stream.close()
+            self.stream = None
+
+    async def run(self) -> None:
+        """
+        Collects frames from the endpoint until cancelled, reconnecting after errors.
+        """
+        while True:
+            try:
+                await self.connect()
+                while True:
+                    await self.collect()
+            except asyncio.CancelledError:
+                await self.close()
+                raise
+            except Exception as e:
+                self.metrics.exceptions_number.observe(1)
+                log.error(
+                    f"Exception in radio endpoint {self.name}: {e.__str__()}, restarting in {self.RESTART_TIME} seconds...")
+                await self.close()
+                await asyncio.sleep(self.RESTART_TIME)
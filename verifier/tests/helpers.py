@@ -0,0 +1,117 @@
+import hashlib
+import http.server
+import json
+import random
+import threading
+from typing import Dict, List, Optional
+
+from core.budget import BudgetManager
+from core.metrics import Metrics
+
+# Metrics are registered globally by prometheus_client, so they are created only once
+_metrics: Optional[Metrics] = None
+
+
+def get_metrics() -> Metrics:
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
+
+def make_frames(n: int, seed: int = 1) -> List[bytes]:
+    """
+    Returns MPEG-1 Layer III frames at 44100 Hz, with random bitrates, padding and payloads.
+    """
+    rand = random.Random(seed)
+    frames = []
+    for _ in range(n):
+        bitrate_index = rand.choice([0x9, 0xb, 0xe])
+        padding = rand.randint(0, 1)
+        bitrate = {0x9: 128, 0xb: 192, 0xe: 320}[bitrate_index]
+        size = 144000 * bitrate // 44100 + padding
+        header = bytes([0xff, 0xfb, (bitrate_index << 4) | (padding << 1), 0x64])
+        frames.append(header + bytes(rand.getrandbits(8) for _ in range(size - 4)))
+    return frames
+
+
+def make_stream(n: int, seed: int = 1) -> bytes:
+    return b''.join(make_frames(n, seed))
+
+
+class Manager:
+    """
+    The parts of a SourceManager used by the collectors, without the metrics server nor the beacon API.
+    """
+
+    def __init__(self, budgets: Dict[str, map] = None):
+        self.metrics = get_metrics()
+        self.budgets = BudgetManager(budgets if budgets is not None else {}, self.metrics)
+
+
+def block_hash(number: int) -> str:
+    return "0x" + hashlib.sha256(str(number).encode()).hexdigest()
+
+
+class JsonRpcHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        node = self.server.node
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        node.requests.append(body)
+        if isinstance(body, list):
+            node.batches.append([int(request["params"][0], 16) for request in body])
+            if node.fail_batches:
+                return self.send({"error": "batch requests are not available"}, 500)
+            return self.send([node.answer(request) for request in body])
+        self.send(node.answer(body))
+
+    def send(self, payload, code: int = 200):
+        content = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class JsonRpcNode:
+    """
+    Local stand-in for an Ethereum JSON-RPC node, answering eth_getBlockByNumber up to its head block.
+    """
+
+    def __init__(self, head: int):
+        self.head = head
+        self.fail_batches = False
+        # Uncle hashes of each block number
+        self.uncles: Dict[int, List[str]] = {}
+        # Bodies of every request, and block numbers of each batched request
+        self.requests = []
+        self.batches = []
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), JsonRpcHandler)
+        self.server.node = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def answer(self, request: map) -> map:
+        tag = request["params"][0]
+        number = self.head if tag == "latest" else int(tag, 16)
+        result = None
+        if number <= self.head:
+            result = {"number": hex(number), "hash": block_hash(number), "parentHash": block_hash(number - 1),
+                      "uncles": self.uncles.get(number, [])}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
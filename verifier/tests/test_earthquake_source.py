@@ -0,0 +1,96 @@
+import http.server
+import threading
+import unittest
+
+import earthquake.source
+from tests.helpers import Manager
+
+
+class SeismologyHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        site = self.server.site
+        site.requests.append(self.path)
+        if self.path == "/summary.html":
+            content = site.summary()
+        else:
+            content = site.detail(self.path.split("/")[-1].split(".html")[0])
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class SeismologySite:
+    """
+    Local stand-in for the seismology site, with a summary page linking to a detail page for each seism.
+    """
+
+    def __init__(self):
+        # Magnitude of each seism id, as shown on both pages
+        self.seisms = {"20240001": "3.1", "20240002": "4.2"}
+        self.requests = []
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SeismologyHandler)
+        self.server.site = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/summary.html"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def summary(self) -> bytes:
+        rows = "".join(f"<tr><td><a href='events/{id}.html'>2024/01/01 10:0{id[-1]}:00</a></td>"
+                       f"<td>2024/01/01 13:0{id[-1]}:00</td><td>-33.1</td><td>-70.2</td><td>10 km</td>"
+                       f"<td>{magnitude} Ml</td><td>GUC</td><td>Santiago</td></tr>"
+                       for id, magnitude in sorted(self.seisms.items(), reverse=True))
+        return f"<html><table><tr><th>Fecha</th></tr>{rows}</table></html>".encode()
+
+    def detail(self, id: str) -> bytes:
+        fields = ["Referencia", "Santiago", "Fecha UTC", f"13:0{id[-1]}:00 01/01/2024", "Latitud", "-33.1",
+                  "Longitud", "-70.2", "Profundidad", "10 km", "Magnitud", f"{self.seisms[id]} Ml",
+                  "Agencia", "GUC"]
+        return ("<html><table>" + "".join(f"<tr><td>{field}</td></tr>" for field in fields)
+                + "</table></html>").encode()
+
+
+class TestDetailCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.site = SeismologySite()
+        self.source = earthquake.source.Source({"source_url": self.site.url, "fetch_interval": 60}, Manager())
+        self.source.loop.close()
+        await self.source.init_collector()
+
+    async def asyncTearDown(self):
+        await self.source.finish_collector()
+        self.site.stop()
+
+    def magnitudes(self):
+        return sorted((event.id, event.magnitude) for event in self.source.buffer.buffer)
+
+    async def test_unchanged_seisms_are_cached(self):
+        await self.source.fetch_seisms()
+        await self.source.fetch_seisms()
+        self.assertEqual(self.site.requests.count("/events/20240001.html"), 1)
+        self.assertEqual(self.site.requests.count("/events/20240002.html"), 1)
+        self.assertEqual(self.magnitudes(), [("20240001", "3.1"), ("20240002", "4.2")])
+
+    async def test_revised_seism_is_requested_again(self):
+        await self.source.fetch_seisms()
+        self.site.seisms["20240002"] = "4.5"
+        await self.source.fetch_seisms()
+        self.assertEqual(self.site.requests.count("/events/20240001.html"), 1)
+        self.assertEqual(self.site.requests.count("/events/20240002.html"), 2)
+        self.assertIn(("20240002", "4.5"), self.magnitudes())
+
+
+if __name__ == '__main__':
+    unittest.main()
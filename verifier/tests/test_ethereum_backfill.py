@@ -0,0 +1,106 @@
+import asyncio
+import unittest
+
+import ethereum.source
+from core.budget import BudgetExceededException
+from tests.helpers import JsonRpcNode, Manager, block_hash
+
+
+class BackfillTestCase(unittest.IsolatedAsyncioTestCase):
+    BUDGETS = {}
+
+    async def asyncSetUp(self):
+        self.node = JsonRpcNode(1000)
+        self.node.start()
+        self.source = ethereum.source.Source({
+            "providers": [{"name": "local", "url": self.node.url}],
+            "fetch_interval": 2,
+        }, Manager(self.BUDGETS))
+        self.source.loop.close()
+        self.api = self.source.sources["local"]
+        self.buffer = self.source.buffers["local"]
+        await self.source.init_collector()
+
+    async def asyncTearDown(self):
+        await self.source.finish_collector()
+        self.node.stop()
+
+    async def poll(self, head: int):
+        self.node.head = head
+        await self.source.fetch_latest_block(self.api)
+
+
+class TestBackfill(BackfillTestCase):
+    async def test_gap_is_filled(self):
+        await self.poll(1000)
+        await self.poll(1010)
+        self.assertEqual(self.node.batches, [list(range(1001, 1010))])
+        self.assertEqual(list(self.buffer.buffer), list(range(1000, 1011)))
+        self.assertIn(block_hash(1005)[2:], self.buffer.get(1005).hashes)
+        self.assertEqual(self.source.last_blocks["local"], 1010)
+
+    async def test_failed_backfill_is_retried(self):
+        await self.poll(1000)
+        self.node.fail_batches = True
+        await self.poll(1010)
+        # The latest block is added even if the gap could not be filled
+        self.assertEqual(list(self.buffer.buffer), [1000, 1010])
+        self.assertEqual(self.source.last_blocks["local"], 1000)
+        self.node.fail_batches = False
+        await self.poll(1012)
+        self.assertEqual(self.node.batches[-1], list(range(1001, 1010)) + [1011])
+        self.assertEqual(list(self.buffer.buffer), list(range(1000, 1013)))
+        self.assertEqual(self.source.last_blocks["local"], 1012)
+        # Only the blocks older than the marker are removed
+        self.assertTrue(self.buffer.check_marker(1005))
+        self.assertEqual(self.buffer.get_range(), (1005, 1012))
+        self.assertEqual(self.source.index.get_providers(1010, block_hash(1010)[2:]), {"local"})
+        self.assertEqual(self.source.index.get_providers(1004, block_hash(1004)[2:]), set())
+
+    async def test_long_outage_is_limited(self):
+        window = ethereum.source.Source.MAX_BACKFILL
+        await self.poll(1000)
+        self.node.fail_batches = True
+        for head in range(1100, 1400, 100):
+            await self.poll(head)
+            # Only the latest blocks are requested, however long the backfill has been failing
+            self.assertEqual(self.node.batches[-1], list(range(head - window, head)))
+            self.assertEqual(self.source.last_blocks["local"], head - window - 1)
+        self.node.fail_batches = False
+        await self.poll(1301)
+        self.assertEqual(self.node.batches[-1], list(range(1301 - window, 1300)))
+        self.assertEqual(list(self.buffer.buffer)[-window - 1:], list(range(1301 - window, 1302)))
+        self.assertEqual(self.source.last_blocks["local"], 1301)
+
+
+class TestBudgetedBackfill(BackfillTestCase):
+    # 2 requests per second, with a burst of 4
+    BUDGETS = {"local": {"requests": 4, "seconds": 2}}
+
+    async def test_cost_over_burst(self):
+        with self.assertRaises(BudgetExceededException) as cm:
+            await self.source.manager.budgets.acquire("local", cost=5)
+        self.assertIn("more than its budget burst of 4", str(cm.exception))
+
+    async def test_backfill_is_split_by_burst(self):
+        self.source.request_timeout = 5
+        await self.poll(1000)
+        await self.poll(1010)
+        self.assertEqual(self.node.batches, [[1001, 1002, 1003, 1004], [1005, 1006, 1007, 1008], [1009]])
+        self.assertEqual(list(self.buffer.buffer), list(range(1000, 1011)))
+
+    async def test_partial_backfill_is_continued(self):
+        self.source.request_timeout = 1.5
+        await self.poll(1000)
+        await self.poll(1013)
+        # The second part would have to wait 2 seconds for its budget, and the rest of the gap is requested later
+        self.assertEqual(self.node.batches, [[1001, 1002, 1003, 1004]])
+        self.assertEqual(self.source.last_blocks["local"], 1004)
+        await asyncio.sleep(2)
+        await self.poll(1014)
+        self.assertEqual(self.node.batches[1:], [[1005, 1006, 1007, 1008]])
+        self.assertEqual(list(self.buffer.buffer), list(range(1000, 1009)) + [1013, 1014])
+        self.assertEqual(self.source.last_blocks["local"], 1008)
+
+if __name__ == '__main__':
+    unittest.main()
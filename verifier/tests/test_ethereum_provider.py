@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+
+from prometheus_client import REGISTRY
+
+from core.budget import BudgetManager
+from ethereum.block import Block
+from ethereum.provider import Provider
+from tests.helpers import get_metrics
+
+
+class FakeProvider(Provider):
+    """
+    A provider whose requests take the durations given in delays, in order.
+    """
+
+    def __init__(self, delays, budgets=None):
+        metrics = get_metrics()
+        super().__init__("fake", "", metrics, budgets if budgets is not None else BudgetManager({}, metrics))
+        self.delays = list(delays)
+        self.calls = 0
+        self.timeouts = []
+
+    async def fetch_block(self, client, tag, timeout):
+        self.timeouts.append(timeout)
+        delay = self.delays[self.calls]
+        self.calls += 1
+        number = self.calls
+        await asyncio.sleep(delay)
+        return Block(number, ["a"]), Block(number - 1, ["b"])
+
+    async def fetch_blocks(self, client, numbers, timeout):
+        return []
+
+
+class TestHedgedRequests(unittest.IsolatedAsyncioTestCase):
+    def throttled(self) -> float:
+        labels = {"provider": "fake", "token": "default"}
+        return REGISTRY.get_sample_value("budget_throttled_total", labels) or 0
+
+    def fill_latency(self, provider, seconds: float):
+        for _ in range(provider.latency.MIN_SAMPLES):
+            provider.latency.add(seconds)
+
+    async def test_not_hedged_without_samples(self):
+        provider = FakeProvider([0.05])
+        await provider.get_latest_block(None, 1)
+        self.assertEqual(provider.calls, 1)
+        self.assertEqual(len(provider.latency), 1)
+
+    async def test_hedge_latency_is_recorded(self):
+        provider = FakeProvider([1, 0.02])
+        self.fill_latency(provider, 0.05)
+        block, _ = await provider.get_latest_block(None, 1)
+        # The answer of the second request is used
+        self.assertEqual(block.number, 2)
+        self.assertEqual(len(provider.latency), provider.latency.MIN_SAMPLES + 1)
+        # The latency goes from the first request to the answer, not only the second request duration
+        self.assertGreaterEqual(provider.latency.samples[-1], 0.07)
+        self.assertLess(provider.latency.samples[-1], 1)
+
+    async def test_first_request_answers_after_hedging(self):
+        provider = FakeProvider([0.1, 1])
+        self.fill_latency(provider, 0.05)
+        block, _ = await provider.get_latest_block(None, 1)
+        self.assertEqual(block.number, 1)
+        self.assertEqual(provider.calls, 2)
+        self.assertGreaterEqual(provider.latency.samples[-1], 0.1)
+
+    async def test_hedge_gets_the_time_left(self):
+        provider = FakeProvider([1, 0.02])
+        self.fill_latency(provider, 0.05)
+        await provider.get_latest_block(None, 0.5)
+        self.assertEqual(provider.timeouts[0], 0.5)
+        # The second request can only take what is left of the first one timeout
+        self.assertLessEqual(provider.timeouts[1], 0.45)
+        self.assertGreater(provider.timeouts[1], 0.3)
+
+    async def test_not_hedged_after_timeout(self):
+        provider = FakeProvider([0.1, 0.01])
+        self.fill_latency(provider, 0.05)
+        await provider.get_latest_block(None, 0.04)
+        self.assertEqual(provider.calls, 1)
+
+    async def test_not_hedged_without_budget(self):
+        budgets = BudgetManager({"fake": {"requests": 1, "seconds": 3600}}, get_metrics())
+        before = self.throttled()
+        provider = FakeProvider([0.1, 0.01], budgets)
+        self.fill_latency(provider, 0.05)
+        block, _ = await provider.get_latest_block(None, 1)
+        self.assertEqual(block.number, 1)
+        self.assertEqual(provider.calls, 1)
+        self.assertGreaterEqual(provider.latency.samples[-1], 0.1)
+        # The hedge nobody needed is not counted as a throttled request
+        self.assertEqual(self.throttled(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
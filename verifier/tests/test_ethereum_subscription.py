@@ -0,0 +1,64 @@
+import time
+import unittest
+
+import ethereum.source
+from ethereum.provider import EMPTY_UNCLES_HASH
+from tests.helpers import JsonRpcNode, Manager, block_hash
+
+UNCLE_HASH = "0x" + "ab" * 32
+
+
+def header(number: int, uncles: bool = False) -> map:
+    return {
+        "number": hex(number),
+        "hash": block_hash(number),
+        "parentHash": block_hash(number - 1),
+        "sha3Uncles": "0x" + "cd" * 32 if uncles else EMPTY_UNCLES_HASH,
+        "timestamp": hex(int(time.time())),
+    }
+
+
+class TestSubscriptionHeaders(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.node = JsonRpcNode(1001)
+        self.node.uncles[1001] = [UNCLE_HASH]
+        self.node.start()
+        self.source = ethereum.source.Source({
+            "providers": [{"name": "local", "url": self.node.url}],
+            "block_id_module": 2,
+        }, Manager())
+        self.source.loop.close()
+        self.api = self.source.sources["local"]
+        self.buffer = self.source.buffers["local"]
+        await self.source.init_collector()
+
+    async def asyncTearDown(self):
+        await self.source.finish_collector()
+        self.node.stop()
+
+    async def test_ancestor_with_uncles(self):
+        await self.source.add_header(self.api, header(1001, uncles=True))
+        self.assertEqual(self.buffer.get(1000).hashes, {block_hash(1000)[2:], UNCLE_HASH[2:]})
+        self.assertEqual(self.source.index.get_providers(1000, UNCLE_HASH[2:]), {"local"})
+
+    async def test_ancestor_without_uncles(self):
+        await self.source.add_header(self.api, header(1001))
+        self.assertEqual(self.buffer.get(1000).hashes, {block_hash(1000)[2:]})
+        # Headers tell when there are no uncles, so the block is not requested
+        self.assertEqual(self.node.requests, [])
+
+    async def test_even_header(self):
+        self.node.head = 1002
+        await self.source.add_header(self.api, header(1002, uncles=True))
+        self.assertEqual(self.buffer.get(1002).hashes, {block_hash(1002)[2:]})
+        self.assertEqual(self.node.requests, [])
+
+    async def test_provider_error(self):
+        self.node.stop()
+        await self.source.add_header(self.api, header(1001, uncles=True))
+        # The ancestor is still added, with the parent hash of the header
+        self.assertEqual(self.buffer.get(1000).hashes, {block_hash(1000)[2:]})
+
+
+if __name__ == '__main__':
+    unittest.main()
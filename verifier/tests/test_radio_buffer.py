@@ -0,0 +1,127 @@
+import unittest
+from unittest import mock
+
+from radio.buffer import Buffer, CompactBuffer
+from radio.frame import Frame
+from tests.helpers import make_frames
+
+FRAME_SIZE = 1045
+
+
+def new_buffer(size: int) -> Buffer:
+    return Buffer(mock.Mock(), mock.Mock(), size, "0")
+
+
+def new_compact_buffer(size: int, frame_size: int = FRAME_SIZE) -> CompactBuffer:
+    return CompactBuffer(mock.Mock(), mock.Mock(), mock.Mock(), size, "0", frame_size)
+
+
+class TestMarkerIndex(unittest.TestCase):
+    def setUp(self):
+        self.frames = [Frame(data=data) for data in make_frames(20)]
+
+    def check_repeated_marker(self, buffer):
+        repeated = self.frames[:10] + [self.frames[3]] + self.frames[10:20]
+        marker = self.frames[3].get_marker()
+        for frame in repeated[:11]:
+            buffer.add(frame)
+        # The first occurrence is kept while it is in the buffer
+        self.assertEqual(buffer.find(marker), 3)
+        for frame in repeated[11:15]:
+            buffer.add(frame)
+        self.assertEqual(buffer.first, 5)
+        self.assertEqual(buffer.find(marker), 10)
+        for frame in repeated[15:]:
+            buffer.add(frame)
+        self.assertEqual(buffer.first, 11)
+        self.assertIsNone(buffer.find(marker))
+        self.assertFalse(buffer.check_marker(marker))
+        self.assertEqual(len(buffer.index.repeats), 0)
+
+    def test_repeated_candidates(self):
+        buffer = Buffer(mock.Mock(), mock.Mock(), 30, "8")
+        for frame in self.frames[:10] * 3:
+            buffer.add(frame)
+        possible = [frame.get_marker() for frame in self.frames[:10] if frame.get_marker()[0] <= "8"]
+        self.assertEqual(len(possible), 6)
+        self.assertEqual(buffer.possible_count(), 6)
+        self.assertEqual(sorted(buffer.get_possible()), sorted(possible))
+        self.assertEqual(buffer.candidates.metric.inc.call_count, 18)
+        # Evicting an occurrence of a repeated candidate keeps it
+        buffer.add(self.frames[10])
+        self.assertEqual(buffer.possible_count(), 7)
+        for frame in self.frames[11:20] * 3:
+            buffer.add(frame)
+        stored = {frame.get_marker() for frame in buffer.get_list(buffer.first, len(buffer))}
+        self.assertEqual(sorted(buffer.get_possible()), sorted(marker for marker in stored if marker[0] <= "8"))
+        self.assertEqual(buffer.possible_count(), len(buffer.get_possible()))
+
+    def test_repeated_marker(self):
+        self.check_repeated_marker(new_buffer(10))
+
+    def test_repeated_marker_compact(self):
+        self.check_repeated_marker(new_compact_buffer(10))
+
+
+class TestCompactBuffer(unittest.TestCase):
+    def setUp(self):
+        self.frames = [Frame(data=data) for data in make_frames(600)]
+
+    def test_ring_grows_with_frames(self):
+        buffer = new_compact_buffer(500)
+        self.assertEqual(len(buffer.data), CompactBuffer.INITIAL_BYTES)
+        for frame in self.frames[:300]:
+            buffer.add(frame)
+        # Nothing is evicted while the ring can grow
+        self.assertEqual(buffer.first, 0)
+        self.assertLess(len(buffer.data), 500 * FRAME_SIZE)
+        used = sum(len(frame.data) for frame in self.frames[:300])
+        self.assertGreaterEqual(len(buffer.data), used)
+        self.assertEqual([frame.data for frame in buffer.get_list(0, 300)], [frame.data for frame in self.frames[:300]])
+        buffer.bytes_metric.set.assert_called_with(buffer.memory_footprint())
+        self.assertGreater(buffer.memory_footprint(), len(buffer.data))
+
+    def test_wrap_around(self):
+        # Frames are up to 1045 bytes, so about half of them fit in the ring
+        buffer = new_compact_buffer(200, 600)
+        for i, frame in enumerate(self.frames):
+            buffer.add(frame)
+            self.assertEqual(buffer.next, i + 1)
+            self.assertLessEqual(len(buffer.data), 200 * 600)
+            # The frames left are the latest ones, and all of them are intact
+            stored = buffer.get_list(buffer.first, len(buffer))
+            self.assertEqual([frame.data for frame in stored],
+                             [frame.data for frame in self.frames[buffer.first:i + 1]])
+        self.assertGreater(buffer.first, 400)
+        self.assertEqual(len(buffer.data), 200 * 600)
+
+    def test_eviction(self):
+        buffer = new_compact_buffer(100)
+        for frame in self.frames[:250]:
+            buffer.add(frame)
+        self.assertEqual((buffer.first, buffer.next), (150, 250))
+        self.assertFalse(buffer.check_marker(self.frames[149].get_marker()))
+        self.assertTrue(buffer.check_marker(self.frames[150].get_marker()))
+        self.assertEqual(buffer.get_list(149, 10), [])
+        self.assertTrue(all(seq >= 150 for seq, _ in buffer.candidates.positions))
+
+    def test_parity_with_buffer(self):
+        # Repeated frames, whose marker is on the buffer more than once
+        frames = self.frames + self.frames[:50]
+        buffer, compact = new_buffer(300), new_compact_buffer(300)
+        for frame in frames:
+            buffer.add(frame)
+            compact.add(frame)
+            self.assertEqual((buffer.first, buffer.next), (compact.first, compact.next))
+        for seq in range(0, len(frames)):
+            marker = frames[seq].get_marker()
+            self.assertEqual(buffer.check_marker(marker), compact.check_marker(marker))
+            self.assertEqual(buffer.find(marker), compact.find(marker))
+            self.assertEqual([frame.data for frame in buffer.get_list(seq, 30)],
+                             [frame.data for frame in compact.get_list(seq, 30)])
+        self.assertEqual(sorted(buffer.get_possible()), sorted(compact.get_possible()))
+        self.assertEqual(buffer.possible_count(), compact.possible_count())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import radio.source
+from radio.buffer import Buffer
+from radio.frame import Frame
+from tests.helpers import Manager
+
+
+def make_frames(n: int):
+    return [Frame(data=b'\xff\xfb\x90\x64' + i.to_bytes(4, "big") * 100) for i in range(n)]
+
+
+class TestFindMatch(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.source = radio.source.Source({
+            "prefix": "",
+            "url": "primary.example",
+            "port": 8000,
+            "alt_endpoints": [{"name": "alternate", "url": "alternate.example", "port": 8000}],
+        }, Manager())
+        self.source.loop.close()
+        self.primary, self.alternate = self.source.stations
+        self.frames = make_frames(self.source.FRAMES_NUM)
+        self.marker = self.frames[0].get_marker()
+        self.raw = b''.join(frame.data for frame in self.frames).hex()
+
+    def fill(self, station, n: int):
+        for frame in self.frames[:n]:
+            station.buffer.add(frame)
+
+    async def test_primary_is_preferred(self):
+        self.fill(self.primary, self.source.FRAMES_NUM)
+        self.fill(self.alternate, self.source.FRAMES_NUM)
+        found, mismatch = await self.source.find_match(self.marker, self.raw)
+        self.assertIs(found, self.primary)
+        self.assertIsNone(mismatch)
+
+    async def test_primary_dropped_after_marker(self):
+        self.fill(self.primary, 210)
+        self.fill(self.alternate, self.source.FRAMES_NUM)
+        found, mismatch = await asyncio.wait_for(self.source.find_match(self.marker, self.raw), timeout=1)
+        self.assertIs(found, self.alternate)
+        self.assertIsNone(mismatch)
+
+    async def test_waits_for_all_stations(self):
+        self.fill(self.primary, 210)
+        self.fill(self.alternate, 100)
+        match = asyncio.ensure_future(self.source.find_match(self.marker, self.raw))
+        await asyncio.sleep(0.01)
+        self.assertFalse(match.done())
+        for frame in self.frames[100:]:
+            self.alternate.buffer.add(frame)
+        found, mismatch = await asyncio.wait_for(match, timeout=1)
+        self.assertIs(found, self.alternate)
+        self.assertIsNone(mismatch)
+
+    async def test_mismatch_of_first_station(self):
+        self.fill(self.primary, self.source.FRAMES_NUM)
+        self.fill(self.alternate, self.source.FRAMES_NUM)
+        found, mismatch = await self.source.find_match(self.marker, self.raw[:-2] + "00")
+        self.assertIs(found, self.primary)
+        self.assertEqual(mismatch.frame_index, self.source.FRAMES_NUM - 1)
+
+    async def test_marker_evicted_while_waiting(self):
+        self.primary.buffer = Buffer(mock.Mock(), mock.Mock(), 150, "")
+        self.fill(self.primary, 100)
+        match = asyncio.ensure_future(self.source.find_match(self.marker, self.raw))
+        await asyncio.sleep(0.01)
+        # The marker frame is evicted before the frames after it arrive
+        for frame in self.frames[100:]:
+            self.primary.buffer.add(frame)
+        found, mismatch = await asyncio.wait_for(match, timeout=1)
+        self.assertIsNone(found)
+        self.assertIsNone(mismatch)
+
+    async def test_marker_not_found(self):
+        self.fill(self.primary, self.source.FRAMES_NUM)
+        found, mismatch = await self.source.find_match("f" * 128, self.raw)
+        self.assertIsNone(found)
+        self.assertIsNone(mismatch)
+
+
+if __name__ == '__main__':
+    unittest.main()
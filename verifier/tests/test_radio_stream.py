@@ -0,0 +1,127 @@
+import asyncio
+import random
+import unittest
+
+from core.http_stream import HTTPStream, HTTPStreamException
+from radio.demuxer import Demuxer, EndOfStreamException
+from radio.icy import IcyReader
+from tests.helpers import make_stream
+
+METAINT = 1000
+
+
+class NullCounter:
+    def inc(self, n=1):
+        pass
+
+
+def add_metadata(data: bytes) -> bytes:
+    """
+    Interleaves an ICY metadata block every METAINT bytes, some of them empty.
+    """
+    out = bytearray()
+    for n, i in enumerate(range(0, len(data), METAINT)):
+        out += data[i:i + METAINT]
+        if i + METAINT >= len(data):
+            break
+        if n % 3 == 2:
+            out += b'\x00'
+        else:
+            metadata = f"StreamTitle='song {n}';".encode()
+            metadata += b'\x00' * (-len(metadata) % 16)
+            out += bytes([len(metadata) // 16]) + metadata
+    return bytes(out)
+
+
+def chunk(body: bytes) -> bytes:
+    rand = random.Random(1)
+    out = bytearray()
+    i = 0
+    while i < len(body):
+        size = rand.randint(1, 3000)
+        out += b'%x\r\n' % len(body[i:i + size]) + body[i:i + size] + b'\r\n'
+        i += size
+    return bytes(out + b'0\r\n\r\n')
+
+
+class IcecastServer:
+    """
+    Local stand-in for an Icecast server, which redirects /; to /live and sends
+    the stream there with chunked transfer encoding and ICY metadata.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.server = None
+        self.requests = []
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+
+    async def handle(self, reader, writer):
+        request = await reader.readuntil(b'\r\n\r\n')
+        self.requests.append(request)
+        path = request.split()[1]
+        if path == b'/;':
+            writer.write(b'HTTP/1.1 302 Found\r\nLocation: /live\r\n\r\n')
+        elif path == b'/live':
+            writer.write(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\nicy-metaint: %d\r\n\r\n' % METAINT)
+            writer.write(chunk(add_metadata(self.data)))
+        else:
+            writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+        await writer.drain()
+        writer.close()
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class TestIcecastStream(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.data = make_stream(300)
+        self.server = IcecastServer(self.data)
+        self.url = await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+
+    async def test_redirect_and_chunked_body(self):
+        stream = HTTPStream(self.url + "/;", headers={"Icy-MetaData": "1"})
+        await stream.open()
+        self.assertEqual(stream.url, self.url + "/live")
+        self.assertEqual(stream.status, 200)
+        self.assertTrue(stream.chunked)
+        self.assertIn(b'Icy-MetaData: 1', self.server.requests[-1])
+        body = bytearray()
+        while True:
+            data = await stream.read(4096)
+            if len(data) == 0:
+                break
+            body += data
+        await stream.close()
+        self.assertEqual(bytes(body), add_metadata(self.data))
+
+    async def test_icy_metadata_is_removed(self):
+        stream = HTTPStream(self.url + "/;")
+        await stream.open()
+        reader = IcyReader(stream, int(stream.headers["icy-metaint"]))
+        demuxer = Demuxer(reader, NullCounter(), NullCounter(), chunk_size=4096)
+        frames = []
+        with self.assertRaises(EndOfStreamException):
+            while True:
+                frames += await demuxer.read_frames()
+        await stream.close()
+        self.assertEqual(len(frames), 300)
+        self.assertEqual(b''.join(frame.data for frame in frames), self.data)
+        self.assertTrue(reader.title.startswith("song "))
+
+    async def test_error_status(self):
+        stream = HTTPStream(self.url + "/missing")
+        with self.assertRaises(HTTPStreamException):
+            await stream.open()
+
+
+if __name__ == '__main__':
+    unittest.main()
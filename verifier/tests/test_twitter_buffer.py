@@ -0,0 +1,52 @@
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from twitter.buffer import Buffer
+from twitter.tweet import Tweet
+
+
+def tweet(id: int, date: str) -> Tweet:
+    return Tweet(str(id), f"2020-06-01T{date}.000Z", "5", f"tweet {id}")
+
+
+class TestBuffer(unittest.TestCase):
+    def setUp(self):
+        self.buffer = Buffer(mock.Mock(), 0, 10, 100)
+
+    def test_get_list_slices_window(self):
+        for i, second in enumerate([3, 0, 10, 7, 10, 11]):
+            self.buffer.add(tweet(1000 + i, f"12:00:{second:02d}"))
+        self.buffer.add(tweet(2000, "12:01:05"))
+        tweets = self.buffer.get_list(datetime(2020, 6, 1, 12, 0, 0), datetime(2020, 6, 1, 12, 0, 10))
+        self.assertEqual([t.id for t in tweets], ["1001", "1000", "1003", "1002", "1004"])
+        tweets = self.buffer.get_list(datetime(2020, 6, 1, 12, 0, 0), datetime(2020, 6, 1, 12, 0, 5))
+        self.assertEqual([t.id for t in tweets], ["1001", "1000"])
+        self.assertEqual(self.buffer.get_list(datetime(2020, 6, 1, 12, 2, 0), datetime(2020, 6, 1, 12, 2, 10)), [])
+
+    def test_check_marker_needs_tweet_at_marker(self):
+        self.buffer.add(tweet(1000, "12:00:03"))
+        # The window exists, but no tweet was created at its start
+        self.assertFalse(self.buffer.check_marker(datetime(2020, 6, 1, 12, 0, 0)))
+        self.buffer.add(tweet(999, "12:00:00"))
+        self.assertTrue(self.buffer.check_marker(datetime(2020, 6, 1, 12, 0, 0)))
+        self.assertFalse(self.buffer.check_marker(datetime(2020, 6, 1, 12, 1, 0)))
+
+    def test_repeated_tweets(self):
+        self.buffer.add(tweet(1000, "12:00:03"))
+        self.buffer.add(tweet(1000, "12:00:03"))
+        self.assertEqual(len(self.buffer), 1)
+        self.assertEqual(self.buffer.get_digest(datetime(2020, 6, 1, 12, 0, 0)).count, 1)
+
+    def test_oldest_windows_are_evicted(self):
+        buffer = Buffer(mock.Mock(), 0, 10, 5)
+        for minute in range(4):
+            for second in range(2):
+                buffer.add(tweet(1000 + 10 * minute + second, f"12:{minute:02d}:{second:02d}"))
+        self.assertEqual(len(buffer), 4)
+        self.assertEqual(buffer.get_possible(), ["2020-06-01T12:02:00", "2020-06-01T12:03:00"])
+        self.assertFalse(buffer.check_marker(datetime(2020, 6, 1, 12, 1, 0)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+import twitter.source
+from core.http_stream import HTTPStream, LineReader
+from tests.helpers import Manager
+
+
+def tweet_line(i: int) -> bytes:
+    return json.dumps({"data": {
+        "id": str(1000 + i),
+        "created_at": f"2020-06-01T12:00:{i % 60:02d}.{i % 1000:03d}Z",
+        "author_id": "5",
+        "text": f"tweet {i}",
+    }}, separators=(",", ":")).encode()
+
+
+class FakeBearerTokenAuth:
+    def __init__(self, consumer_key, consumer_secret):
+        self.bearer_token = "token"
+
+
+class NDJSONServer:
+    """
+    Local stand-in for the Twitter sampled stream, which sends tweets as
+    newline delimited JSON with chunked transfer encoding and keep-alive empty
+    lines, and then keeps the connection open without sending anything.
+    """
+
+    def __init__(self, lines: int, chunk_size: int = 5000):
+        self.body = b''.join(tweet_line(i) + b'\r\n' + (b'\r\n' if i % 7 == 0 else b'') for i in range(lines))
+        self.chunk_size = chunk_size
+        self.server = None
+        self.requests = []
+        self.stopped = asyncio.Event()
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/stream"
+
+    async def handle(self, reader, writer):
+        self.requests.append(await reader.readuntil(b'\r\n\r\n'))
+        writer.write(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n')
+        for i in range(0, len(self.body), self.chunk_size):
+            data = self.body[i:i + self.chunk_size]
+            writer.write(b'%x\r\n' % len(data) + data + b'\r\n')
+            await writer.drain()
+        await self.stopped.wait()
+        writer.close()
+
+    async def stop(self):
+        self.stopped.set()
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class TestLineReader(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = NDJSONServer(500, chunk_size=777)
+        self.url = await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+
+    async def test_lines_across_chunks(self):
+        stream = HTTPStream(self.url)
+        await stream.open()
+        reader = LineReader(stream, timeout=0.5, chunk_size=100)
+        lines = []
+        with self.assertRaises(asyncio.TimeoutError):
+            while True:
+                lines.append(await reader.readline())
+        await stream.close()
+        tweets = [line for line in lines if len(line) > 0]
+        self.assertEqual(tweets, [tweet_line(i) for i in range(500)])
+        self.assertEqual(len(lines) - len(tweets), len(range(0, 500, 7)))
+
+
+class TestTwitterCollector(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = NDJSONServer(3000)
+        self.source = twitter.source.Source({
+            "consumer_key": "key",
+            "consumer_secret": "secret",
+            "tweet_interval": 10,
+            "second_start": 0,
+            "stream_url": await self.server.start(),
+        }, Manager({"twitter_stream": {"requests": 5, "seconds": 900}}))
+        self.source.loop.close()
+        self.source.loop = asyncio.get_running_loop()
+        self.source.READ_TIMEOUT = 0.5
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+
+    @mock.patch("twitter.source.BearerTokenAuth", FakeBearerTokenAuth)
+    async def test_collect(self):
+        await self.source.init_collector()
+        self.assertIn(b'Authorization: Bearer token', self.server.requests[-1])
+        collected = 0
+        with self.assertRaises(twitter.source.TwitterCollectorException):
+            while True:
+                await self.source.collect()
+                collected += 1
+        await self.source.finish_collector()
+        # Only the tweets from the first 10 seconds of every minute pass the window pre-filter
+        in_window = [i for i in range(3000) if i % 60 <= 10]
+        self.assertEqual(collected, len(in_window))
+        self.assertEqual(len(self.source.buffer), len(in_window))
+
+
+if __name__ == '__main__':
+    unittest.main()
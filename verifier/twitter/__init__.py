@@ -1 +1 @@
-__all__ = ["tweet", "source"]
+__all__ = ["tweet", "diff", "digest", "prefilter", "source"]
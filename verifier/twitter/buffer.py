@@ -1,8 +1,9 @@
-import heapq
+import bisect
 import logging
-from datetime import datetime
-from typing import List, Set, Tuple
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 
+from twitter.digest import WindowDigest
 from twitter.tweet import Tweet
 from prometheus_client import *
 
@@ -10,58 +11,77 @@ log = logging.getLogger(__name__)
 
 
 class Buffer:
-    def __init__(self, metric: Gauge, second_start: int, size: int):
-        self.buffer: List[Tweet] = []
+    """
+    Tweets grouped by collection window.
+    Each window is keyed by its start date (second_start of the minute the
+    tweets were created in) and keeps its tweets sorted by creation date and
+    ID, which is the order of their IDs, as tweet IDs grow with time. So
+    markers and date ranges are found by bisection. Lookups do not
+    remove tweets, and whole windows are evicted, oldest first, when the
+    buffer has more than size tweets.
+    Each window also keeps the digest of its tweets created up to interval
+    seconds after its start, which are the ones the beacon uses.
+    """
+
+    def __init__(self, metric: Gauge, second_start: int, interval: int, size: int):
+        self.windows: Dict[datetime, List[Tuple[datetime, int, Tweet]]] = {}
+        self.digests: Dict[datetime, WindowDigest] = {}
         self.second_start: int = second_start
-        self.possible: Set(str) = set()
+        self.interval = timedelta(seconds=interval)
         self.size = size
+        self.count = 0
         self.metric = metric
 
     def __len__(self):
-        return len(self.buffer)
+        return self.count
+
+    def window_start(self, date: datetime) -> datetime:
+        return date.replace(second=self.second_start, microsecond=0)
 
     def add(self, item: Tweet) -> None:
-        if len(self.buffer) == self.size:
-            out = heapq.heappushpop(self.buffer, create_heap_item(item))
-            if out[-1].datestr in self.possible:
-                self.possible.remove(out[-1].datestr)
-        else:
-            heapq.heappush(self.buffer, create_heap_item(item))
-            if item.date.second == self.second_start:
-                self.possible.add(item.datestr)
-        self.metric.observe(len(self.buffer))
+        key = self.window_start(item.date)
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = []
+            self.digests[key] = WindowDigest()
+        entry = (item.date, int(item.id), item)
+        i = bisect.bisect_left(window, entry[:2])
+        if i < len(window) and window[i][:2] == entry[:2]:
+            # Repeated tweet
+            return
+        window.insert(i, entry)
+        if item.date <= key + self.interval:
+            self.digests[key].add(item.get_canonical_form())
+        self.count += 1
+        while self.count > self.size and len(self.windows) > 1:
+            oldest = min(self.windows)
+            self.count -= len(self.windows.pop(oldest))
+            del self.digests[oldest]
+        self.metric.observe(self.count)
 
-    def check_marker(self, marker: datetime.date) -> bool:
+    def check_marker(self, marker: datetime) -> bool:
+        """
+        Returns True if there is a tweet created at the marker date.
+        """
         log.debug(
-            f"checking marker {marker} (buffer size = {len(self.buffer)} items)")
-        resp = False
-        while len(self.buffer) > 0:
-            item = heapq.heappop(self.buffer)
-            if item[-1].datestr in self.possible:
-                self.possible.remove(item[-1].datestr)
-            if item[-1].date == marker:
-                heapq.heappush(self.buffer, item)
-                self.possible.add(item[-1].datestr)
-                resp = True
-                break
-        self.metric.observe(len(self.buffer))
-        return resp
+            f"checking marker {marker} (buffer size = {self.count} items)")
+        window = self.windows.get(self.window_start(marker), [])
+        i = bisect.bisect_left(window, (marker,))
+        return i < len(window) and window[i][0] == marker
 
-    def get_list(self, end_date: datetime.date) -> List[Tweet]:
-        items = []
-        while len(self.buffer) > 0:
-            item = heapq.heappop(self.buffer)
-            if item[-1].datestr in self.possible:
-                self.possible.remove(item[-1].datestr)
-            if item[-1].date <= end_date:
-                items.append(item[-1])
-            else:
-                heapq.heappush(self.buffer, item)
-                self.possible.add(item[-1].datestr)
-                break
-        self.metric.observe(len(self.buffer))
-        return items
+    def get_list(self, start_date: datetime, end_date: datetime) -> List[Tweet]:
+        """
+        Returns the tweets of the window starting at start_date created up to end_date, sorted by date and ID.
+        """
+        window = self.windows.get(self.window_start(start_date), [])
+        end = bisect.bisect_left(window, (end_date + timedelta(microseconds=1),))
+        return [tweet for _, _, tweet in window[:end]]
 
+    def get_digest(self, start_date: datetime) -> Optional[WindowDigest]:
+        """
+        Returns the digest of the tweets of the window starting at start_date created up to interval seconds later.
+        """
+        return self.digests.get(self.window_start(start_date))
 
-def create_heap_item(item: Tweet) -> Tuple[datetime, int, Tweet]:
-    return item.date, item.id, item
+    def get_possible(self) -> List[str]:
+        return [key.isoformat() for key in self.windows]
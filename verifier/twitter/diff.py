@@ -0,0 +1,62 @@
+import json
+import logging
+from typing import Iterable, List
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class TweetDiff:
+    """
+    Difference between two sets of tweet IDs, computed on sorted int64 arrays.
+    """
+    SAMPLE_SIZE = 10
+
+    def __init__(self, ours: np.ndarray, theirs: np.ndarray):
+        self.ours = ours
+        self.theirs = theirs
+        self.our_uniq = np.setdiff1d(ours, theirs, assume_unique=True)
+        self.their_uniq = np.setdiff1d(theirs, ours, assume_unique=True)
+
+    def is_empty(self) -> bool:
+        return self.our_uniq.size == 0 and self.their_uniq.size == 0
+
+    def get_details(self) -> List[str]:
+        return [
+            f"our_buf_len={self.ours.size}",
+            f"their_buf_len={self.theirs.size}",
+            f"our_id_range={id_range(self.ours)}",
+            f"their_id_range={id_range(self.theirs)}",
+            f"our_uniq_len={self.our_uniq.size}",
+            f"their_uniq_len={self.their_uniq.size}",
+            f"our_uniq_sample=[{','.join(str(x) for x in self.our_uniq[:self.SAMPLE_SIZE])}]",
+            f"their_uniq_sample=[{','.join(str(x) for x in self.their_uniq[:self.SAMPLE_SIZE])}]",
+        ]
+
+
+def id_range(ids: np.ndarray) -> str:
+    return f"{ids[0]}_{ids[-1]}" if ids.size > 0 else ""
+
+
+def id_array(ids: Iterable) -> np.ndarray:
+    """
+    Returns the given tweet IDs as a sorted int64 array without repeated values.
+    """
+    return np.unique(np.fromiter((int(i) for i in ids), dtype=np.int64))
+
+
+def parse_tweet_ids(tweet_list: str) -> np.ndarray:
+    """
+    Returns the IDs of a tweet list sent by the beacon as a sorted int64 array.
+    """
+    try:
+        if len(tweet_list) == 0:
+            log.error("empty tweet list")
+        else:
+            tweet_json_list = json.loads(tweet_list)
+            if tweet_json_list is not None:
+                return id_array(t["id"] for t in tweet_json_list)
+    except Exception as e:
+        log.error(f"cannot parse tweet list: {e}")
+    return id_array([])
@@ -0,0 +1,53 @@
+import hashlib
+import json
+import logging
+from typing import Optional
+
+from twitter.tweet import canonical_form
+
+log = logging.getLogger(__name__)
+
+
+class WindowDigest:
+    """
+    Order independent digest of a set of tweets: the sum, modulo 2^512, of
+    the SHA3-512 digests of their canonical forms.
+    It is updated one tweet at a time, so the collector can keep the digest
+    of each window while tweets arrive in any order.
+    """
+    MODULUS = 2 ** 512
+
+    def __init__(self):
+        self.value = 0
+        self.count = 0
+
+    def add(self, canonical: bytes) -> None:
+        h = int.from_bytes(hashlib.sha3_512(canonical).digest(), "big")
+        self.value = (self.value + h) % self.MODULUS
+        self.count += 1
+
+    def __eq__(self, other):
+        return isinstance(other, WindowDigest) and self.count == other.count and self.value == other.value
+
+    def __str__(self) -> str:
+        return f"WindowDigest<count={self.count},value={self.value:0128x}>"
+
+
+def digest_tweet_list(tweet_list: str) -> Optional[WindowDigest]:
+    """
+    Returns the digest of a tweet list sent by the beacon, without building Tweet objects.
+    :return: the digest of the list, or None if it cannot be parsed
+    """
+    digest = WindowDigest()
+    try:
+        if len(tweet_list) == 0:
+            log.error("empty tweet list")
+        else:
+            tweet_json_list = json.loads(tweet_list)
+            if tweet_json_list is not None:
+                for t in tweet_json_list:
+                    digest.add(canonical_form(t["id"], t["created_at"], t["author_id"], t["text"]))
+    except Exception as e:
+        log.error(f"cannot parse tweet list: {e}")
+        return None
+    return digest
@@ -0,0 +1,33 @@
+from typing import Optional
+
+
+class WindowFilter:
+    """
+    Checks if a raw tweet line was created inside the collection window,
+    reading its created_at field directly from the JSON text instead of
+    decoding the whole line.
+    As in the collector, the window goes from second_start to
+    second_start + interval of each minute, both whole seconds included.
+    """
+    CREATED_AT = b'"created_at":"'
+    # created_at looks like 2020-06-01T12:00:05.123Z
+    SECONDS_POS = 17
+
+    def __init__(self, second_start: int, interval: int):
+        self.start = second_start
+        self.end = second_start + interval
+
+    def accepts(self, line: bytes) -> Optional[bool]:
+        """
+        :param line: raw tweet line, as sent by the stream
+        :return: True if the tweet is in the window, False if it is not,
+        and None if the date cannot be read from the line
+        """
+        pos = line.find(self.CREATED_AT)
+        if pos < 0:
+            return None
+        pos += len(self.CREATED_AT) + self.SECONDS_POS
+        seconds = line[pos:pos + 2]
+        if not seconds.isdigit():
+            return None
+        return self.start <= int(seconds) <= self.end
@@ -1,7 +1,8 @@
+import asyncio
 import datetime
 import json
 import logging
-from typing import List
+from typing import List, Optional
 
 import requests
 from requests.auth import AuthBase
@@ -10,7 +11,11 @@ from core.source_manager import SourceManager
 from core.results import VerifierException, VerifierResult
 
 from core.abstract_source import AbstractSource
+from core.http_stream import HTTPStream, HTTPStreamException, LineReader
 from twitter.buffer import Buffer
+from twitter.diff import TweetDiff, id_array, parse_tweet_ids
+from twitter.digest import digest_tweet_list
+from twitter.prefilter import WindowFilter
 from twitter.tweet import Tweet
 
 log = logging.getLogger(__name__)
@@ -55,6 +60,13 @@ class BearerTokenAuth(AuthBase):
 class Source(AbstractSource):
     STREAM_URL = "https://api.twitter.com/2/tweets/sample/stream?tweet.fields=created_at&expansions=author_id"
     BUFFER_SIZE = 20000
+    QUEUE_SIZE = 10000
+    # Twitter sends a keep-alive line every 20 seconds
+    READ_TIMEOUT = 30
+    MAX_EMPTY_LINES = 10
+    # Names of the budgets of the bearer token endpoint and the stream endpoint
+    TOKEN_BUDGET = "twitter_token"
+    STREAM_BUDGET = "twitter_stream"
     NAME = "twitter"
 
     def __init__(self, config: map, mgr: SourceManager):
@@ -63,8 +75,12 @@ class Source(AbstractSource):
         self.tweet_interval = config["tweet_interval"]
         self.second_start = config["second_start"]
         self.buffer = Buffer(mgr.metrics.collector_buffer_size.labels(
-            self.name()), self.second_start, self.BUFFER_SIZE)
-        self.response = None
+            self.name()), self.second_start, self.tweet_interval, self.BUFFER_SIZE)
+        self.stream_url = config.get("stream_url", self.STREAM_URL)
+        self.window_filter = WindowFilter(self.second_start, self.tweet_interval)
+        self.stream: Optional[HTTPStream] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.reader_task: Optional[asyncio.Task] = None
         super().__init__(mgr)
 
     async def verify(self, params: map) -> map:
@@ -78,7 +94,7 @@ class Source(AbstractSource):
                 f"ExtValue is not valid."
                 f"status={status}")
         else:
-            their_list = parse_tweet_list(params["raw"])
+            their_digest = digest_tweet_list(params["raw"])
             start_date = datetime.datetime.fromisoformat(
                 params["metadata"][:-1])
             end_date = start_date + \
@@ -88,102 +104,122 @@ class Source(AbstractSource):
                 result.add_detail(
                     f"Marker did not start in expected second.",
                     f"second={self.second_start}")
-            elif len(their_list) == 0:
+            elif their_digest is None or their_digest.count == 0:
                 result.status_code = 222
                 result.add_detail("Beacon reported an empty tweet list")
-            elif self.buffer.check_marker(start_date):
-                our_list = self.buffer.get_list(end_date)
+            elif not self.buffer.check_marker(start_date):
+                result.status_code = 222
+                result.add_detail(
+                    f"metadata not found",
+                    f"metadata={params['metadata']}",
+                    f"buffer_size={len(self.buffer)}")
+            elif their_digest == self.buffer.get_digest(start_date):
+                # Same tweets on both sides, there is no need to compare the lists
+                self.manager.metrics.twitter_extra_tweets.labels(
+                    'verifier').set(0)
+                self.manager.metrics.twitter_extra_tweets.labels(
+                    'beacon').set(0)
+            else:
+                their_ids = parse_tweet_ids(params["raw"])
+                our_list = self.buffer.get_list(start_date, end_date)
                 if len(our_list) == 0:
                     result.status_code = 222
                     result.add_detail("Verifier reported an empty tweet list")
                 else:
-                    i, j = 0, 0
-                    our_uniq, their_uniq = [], []
-                    while i < len(our_list) and j < len(their_list):
-                        ours = our_list[i]
-                        theirs = their_list[j]
-                        if ours < theirs:
-                            our_uniq.append(ours)
-                            i += 1
-                        elif theirs < ours:
-                            their_uniq.append(theirs)
-                            j += 1
-                        else:
-                            i += 1
-                            j += 1
-                    our_uniq += our_list[i:]
-                    their_uniq += their_list[j:]
+                    diff = TweetDiff(id_array(t.id for t in our_list), their_ids)
                     self.manager.metrics.twitter_extra_tweets.labels(
-                        'verifier').set(len(our_uniq))
+                        'verifier').set(diff.our_uniq.size)
                     self.manager.metrics.twitter_extra_tweets.labels(
-                        'beacon').set(len(their_uniq))
-                    if len(our_uniq) > 0 or len(their_uniq) > 0:
-                        result.code = 221
+                        'beacon').set(diff.their_uniq.size)
+                    if not diff.is_empty():
+                        result.status_code = 221
                         result.add_detail(
                             f"Some items are not on both lists",
-                            f"our_buf_len={len(our_list)} ",
-                            f"their_buf_len={len(their_list)} ",
-                            f"our_interval={our_list[0].datestr}_{our_list[-1].datestr} ",
-                            f"their_interval={their_list[0].datestr}_{their_list[-1].datestr} ",
-                            f"our_uniq=[{','.join([str(x) for x in our_uniq])}] ",
-                            f"their_uniq=[{','.join([str(x) for x in their_uniq])}]")
-            else:
-                result.status_code = 222
-                result.add_detail(
-                    f"metadata not found",
-                    f"metadata={params['metadata']}",
-                    f"buffer_size={len(self.buffer)}")
+                            *diff.get_details())
         result.finish()
         return result
 
     async def init_collector(self) -> None:
-        bearer_token = BearerTokenAuth(self.key, self.secret)
-        self.response = requests.get(self.STREAM_URL, auth=bearer_token,
-                                     headers={
-                                         "User-Agent": "RandomVerifier-Python"},
-                                     stream=True)
+        if self.stream is not None:
+            # Restarting after an error
+            await self.finish_collector()
+        budgets = self.manager.budgets
+        bearer_token = await budgets.get_credential(self.TOKEN_BUDGET, self.key, self.get_bearer_token)
+        await budgets.acquire(self.STREAM_BUDGET, self.key)
+        self.stream = HTTPStream(self.stream_url, {
+            "User-Agent": "RandomVerifier-Python",
+            "Authorization": f"Bearer {bearer_token}"})
+        try:
+            await self.stream.open()
+        except HTTPStreamException:
+            if self.stream.status == 401:
+                budgets.invalidate_credential(self.TOKEN_BUDGET, self.key)
+            raise
+        self.queue = asyncio.Queue(self.QUEUE_SIZE)
+        self.reader_task = asyncio.create_task(self.read_lines(LineReader(self.stream, self.READ_TIMEOUT)))
+
+    async def read_lines(self, reader: LineReader) -> None:
+        """
+        Reads tweet lines from the stream into the queue.
+        Exceptions are queued too, so they are raised by the collector.
+        """
+        try:
+            empty_lines_in_a_row = 0
+            while True:
+                line = await reader.readline()
+                if line is None:
+                    raise TwitterCollectorException("stream closed by twitter")
+                if len(line) == 0:
+                    empty_lines_in_a_row += 1
+                    if empty_lines_in_a_row >= self.MAX_EMPTY_LINES:
+                        log.error("Empty line received from Twitter. Restarting...")
+                        raise TwitterCollectorException(
+                            "empty line received from twitter")
+                    continue
+                empty_lines_in_a_row = 0
+                # Tweets outside the window are discarded before decoding them
+                if self.window_filter.accepts(line) is False:
+                    self.manager.metrics.twitter_prefilter_lines.labels('rejected').inc()
+                    continue
+                self.manager.metrics.twitter_prefilter_lines.labels('accepted').inc()
+                if self.queue.full():
+                    self.manager.metrics.twitter_queue_stalls.inc()
+                await self.queue.put(line)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            await self.queue.put(TwitterCollectorException(f"no data received in {self.READ_TIMEOUT} seconds"))
+        except Exception as e:
+            await self.queue.put(e)
+
+    async def get_bearer_token(self) -> str:
+        auth = await self.loop.run_in_executor(None, BearerTokenAuth, self.key, self.secret)
+        return auth.bearer_token
 
     async def collect(self) -> None:
-        empty_lines_in_a_row = 0
-        for response_line in self.response.iter_lines():
-            if response_line:
-                empty_lines_in_a_row = 0
-                resp = json.loads(response_line)
-                if "data" not in resp:
-                    raise TwitterCollectorException(f"{resp}")
-                t = resp["data"]
-                tweet = Tweet(t["id"], t["created_at"],
-                              t["author_id"], t["text"])
-                start_date = tweet.date.replace(second=self.second_start)
-                end_date = start_date + \
-                    datetime.timedelta(seconds=self.tweet_interval)
-                if tweet.date >= start_date and tweet.date <= end_date:
-                    self.buffer.add(tweet)
-            else:
-                empty_lines_in_a_row += 1
-                if empty_lines_in_a_row >= 10:
-                    log.error("Empty line received from Twitter. Restarting...")
-                    raise TwitterCollectorException(
-                        "empty line received from twitter")
+        response_line = await self.queue.get()
+        self.manager.metrics.twitter_queue_size.set(self.queue.qsize())
+        if isinstance(response_line, Exception):
+            raise response_line
+        resp = json.loads(response_line)
+        if "data" not in resp:
+            raise TwitterCollectorException(f"{resp}")
+        t = resp["data"]
+        tweet = Tweet(t["id"], t["created_at"],
+                      t["author_id"], t["text"])
+        start_date = tweet.date.replace(second=self.second_start)
+        end_date = start_date + \
+            datetime.timedelta(seconds=self.tweet_interval)
+        if tweet.date >= start_date and tweet.date <= end_date:
+            self.buffer.add(tweet)
 
     async def finish_collector(self) -> None:
-        self.response.close()
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+            self.reader_task = None
+        await self.stream.close()
+        self.stream = None
 
     def get_possible(self) -> List[str]:
-        return [s for s in self.buffer.possible]
+        return self.buffer.get_possible()
 
-
-def parse_tweet_list(tweet_list: str) -> List[Tweet]:
-    tweets = []
-    try:
-        if len(tweet_list) == 0:
-            log.error("empty tweet list")
-        else:
-            tweet_json_list = json.loads(tweet_list)
-            if tweet_json_list is not None:
-                for t in tweet_json_list:
-                    tweets.append(Tweet(t["id"], t["created_at"],
-                                        t["author_id"], t["text"]))
-    except Exception as e:
-        log.error(f"cannot parse tweet list: {e}")
-    return tweets
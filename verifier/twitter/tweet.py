@@ -1,26 +1,31 @@
 import datetime
 
+from core.record import Record
 
-class Tweet:
+
+class Tweet(Record):
+    __slots__ = ("id", "datestr", "date", "author", "message")
 
     def __init__(self, id: int, created_date: str, author: str, message: str):
+        super().__init__()
         self.id: int = id
         self.datestr: str = created_date
         self.date: datetime.datetime = datetime.datetime.fromisoformat(created_date[:-1])
         self.author: str = author
         self.message: str = message
 
-    def get_canonical_form(self) -> bytes:
-        return (self.datestr + str(self.id) + self.author + self.message).encode()
+    def canonical_form(self) -> bytes:
+        return canonical_form(self.id, self.datestr, self.author, self.message)
 
     def get_tuple(self):
         return self.datestr, self.id, self.author, self.message
 
-    def __eq__(self, other):
-        return self.get_tuple() == other.get_tuple()
-
-    def __gt__(self, other):
-        return self.id > other.id
+    def get_sort_key(self):
+        return (int(self.id),) + self.get_tuple()
 
     def __str__(self) -> str:
         return f"Tweet<id={self.id},date={self.datestr},author={self.author},message={self.message}>"
+
+
+def canonical_form(id: int, created_date: str, author: str, message: str) -> bytes:
+    return (created_date + str(id) + author + message).encode()